@@ -0,0 +1,23 @@
+import pytest
+
+from benchmarks.payloads import CHANNEL, STREAM_START, continuation_payload
+from matsuri_monitor import chat, clients
+
+
+@pytest.fixture
+def video_info() -> chat.VideoInfo:
+    return chat.VideoInfo("benchmark", "Benchmark stream", CHANNEL, STREAM_START)
+
+
+@pytest.fixture
+def monitor(video_info: chat.VideoInfo) -> clients.Monitor:
+    report = chat.LiveReport(video_info)
+    return clients.Monitor(
+        video_info, report, clients.SessionPool(), clients.RequestScheduler()
+    )
+
+
+@pytest.fixture
+def continuation() -> dict:
+    """A busy poll's worth of continuation actions"""
+    return continuation_payload(1_000)
@@ -0,0 +1,142 @@
+"""Synthetic chat payloads for the benchmarks, shaped like YouTube's live chat responses"""
+
+import json
+import random
+from typing import List
+
+from matsuri_monitor import chat
+
+STREAM_START = 1_600_000_000.0
+CHANNEL = chat.ChannelInfo("UCQ0UDLQCjY0rmuxCDE38FGg", "Matsuri", "", "Hololive")
+AUTHORS = [f"viewer{i}" for i in range(500)]
+TEXTS = ["まつり", "matsuri!", "草", "こんばんは", "lol", "かわいい", "8888888"]
+
+# Share of continuation actions that are super chats and non-chat actions (deletions,
+# banners, ticker updates), which parse_actions must skip
+SUPERCHAT_SHARE = 0.02
+OTHER_SHARE = 0.1
+
+
+def text_action(author: str, text: str, timestamp: float) -> dict:
+    """An addChatItemAction for a plain chat message, as YouTube sends it"""
+    return {
+        "addChatItemAction": {
+            "item": {
+                "liveChatTextMessageRenderer": {
+                    "id": f"{author}:{timestamp}",
+                    "authorName": {"simpleText": author},
+                    "message": {"runs": [{"text": text}, {"emojiId": "x"}]},
+                    "timestampUsec": str(int(timestamp * 1_000_000)),
+                }
+            },
+            "clientId": f"{author}:{timestamp}",
+        }
+    }
+
+
+def superchat_action(author: str, text: str, timestamp: float) -> dict:
+    """An addLiveChatTickerItemAction for a super chat, as YouTube sends it"""
+    return {
+        "addLiveChatTickerItemAction": {
+            "item": {
+                "liveChatTickerPaidMessageItemRenderer": {
+                    "showItemEndpoint": {
+                        "showLiveChatItemEndpoint": {
+                            "renderer": {
+                                "liveChatPaidMessageRenderer": {
+                                    "authorName": {"simpleText": author},
+                                    "message": {"runs": [{"text": text}]},
+                                    "timestampUsec": str(int(timestamp * 1_000_000)),
+                                    "purchaseAmountText": {"simpleText": "¥1,000"},
+                                }
+                            }
+                        }
+                    }
+                }
+            },
+            "durationSec": "60",
+        }
+    }
+
+
+def other_action(timestamp: float) -> dict:
+    """A non-chat action, which parses to no message"""
+    return {"markChatItemAsDeletedAction": {"targetItemId": str(timestamp)}}
+
+
+def continuation_payload(num_actions: int, seed: int = 0) -> dict:
+    """A synthetic get_live_chat response holding the given number of actions"""
+    rand = random.Random(seed)
+    actions = []
+
+    for i in range(num_actions):
+        timestamp = STREAM_START + i * 0.05
+        kind = rand.random()
+        if kind < OTHER_SHARE:
+            actions.append(other_action(timestamp))
+            continue
+
+        author, text = rand.choice(AUTHORS), rand.choice(TEXTS)
+        if kind < OTHER_SHARE + SUPERCHAT_SHARE:
+            actions.append(superchat_action(author, text, timestamp))
+        else:
+            actions.append(text_action(author, text, timestamp))
+
+    return {
+        "continuationContents": {
+            "liveChatContinuation": {
+                "continuations": [
+                    {"timedContinuationData": {"continuation": "0", "timeoutMs": 5000}}
+                ],
+                "actions": actions,
+            }
+        }
+    }
+
+
+def chat_messages(
+    count: int, start: float = STREAM_START, rate: float = 20, seed: int = 0
+) -> List[chat.Message]:
+    """Messages arriving at the given rate per second from the given time, in order"""
+    rand = random.Random(seed)
+    return [
+        chat.Message(
+            author=rand.choice(AUTHORS),
+            text=rand.choice(TEXTS),
+            timestamp=start + i / rate,
+            relative_timestamp=i / rate,
+        )
+        for i in range(count)
+    ]
+
+
+def live_chat_page(num_actions: int = 100, filler_bytes: int = 500_000) -> bytes:
+    """A synthetic live_chat page, with ytcfg in the head and the initial chat data in the body
+
+    Like the real page, both are surrounded by large inline scripts, and most of the page comes
+    after the initial chat data.
+    """
+    filler_line = "var _f=function(a){return a.map(function(b){return b*2})};\n"
+    filler = (
+        "<script>" + filler_line * (filler_bytes // 2 // len(filler_line)) + "</script>"
+    )
+
+    ytcfg = {
+        "INNERTUBE_API_KEY": "AIzaSyBenchmarkKey",
+        "INNERTUBE_CONTEXT": {"client": {"clientName": "WEB", "clientVersion": "2.0"}},
+    }
+    initial_data = continuation_payload(num_actions)["continuationContents"]
+    initial_data = {
+        "contents": {"liveChatRenderer": initial_data["liveChatContinuation"]}
+    }
+
+    page = (
+        "<!DOCTYPE html><html><head>"
+        + filler
+        + f"<script>ytcfg.set({json.dumps(ytcfg)});</script>"
+        + "</head><body>"
+        + f'<script>window["ytInitialData"] = {json.dumps(initial_data)};</script>'
+        + filler
+        + "</body></html>"
+    )
+    return page.encode()
@@ -0,0 +1,53 @@
+import re
+
+import pytest
+
+from benchmarks.payloads import STREAM_START
+from matsuri_monitor import chat
+
+BURST_SIZE = 10_000
+BURST_RATE = 200
+
+
+def matsuri_grouper(unique_author: bool) -> chat.Grouper:
+    exp = re.compile("まつり")
+    return chat.Grouper(
+        type="regex",
+        value="まつり",
+        condition=lambda message: exp.search(message.text) is not None,
+        description='Comment matches "まつり"',
+        interval=10,
+        min_len=5,
+        notify=True,
+        unique_author=unique_author,
+        skip_channels=[],
+    )
+
+
+@pytest.mark.parametrize("unique_author", [True, False])
+def test_burst(benchmark, unique_author):
+    """A spam wave of matching messages, all close enough together to form one group
+
+    Each viewer posts twice in a row, so with unique_author half of the messages are rejected.
+    """
+    burst = [
+        chat.Message(
+            author=f"viewer{i // 2}",
+            text="まつり",
+            timestamp=STREAM_START + i / BURST_RATE,
+            relative_timestamp=i / BURST_RATE,
+        )
+        for i in range(BURST_SIZE)
+    ]
+    grouper = matsuri_grouper(unique_author)
+
+    def new_group_list():
+        group_list = chat.GroupList(grouper)
+        group_lists.append(group_list)
+        return (group_list, burst), {}
+
+    group_lists = []
+    benchmark.pedantic(chat.GroupList.update, setup=new_group_list, rounds=10)
+
+    expected_len = BURST_SIZE // 2 if unique_author else BURST_SIZE
+    assert [len(group) for group in group_lists[-1].groups] == [expected_len]
@@ -0,0 +1,27 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_DIR = Path(__file__).parent.parent
+
+# Interpreter startup alone, as a baseline for the imports
+IMPORTS = ["", "matsuri_monitor", "matsuri_monitor.clients.holodex"]
+
+
+def run_python(code: str):
+    subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, check=True)
+
+
+@pytest.mark.parametrize("module", IMPORTS, ids=lambda module: module or "baseline")
+def test_import_time(benchmark, module):
+    """Time to start a fresh interpreter and import the module"""
+    code = f"import {module}" if module else "pass"
+    benchmark.pedantic(run_python, args=(code,), rounds=10)
+
+
+def test_no_pandas():
+    run_python(
+        "import sys, matsuri_monitor.clients.holodex; assert 'pandas' not in sys.modules"
+    )
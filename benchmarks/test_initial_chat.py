@@ -0,0 +1,34 @@
+import pytest
+
+from benchmarks.payloads import live_chat_page
+from matsuri_monitor.clients.initial_chat import (
+    InitialChatExtractor,
+    parse_initial_chat_html,
+)
+from matsuri_monitor.clients.monitor import INITIAL_CHAT_CHUNK_SIZE
+
+
+@pytest.fixture(scope="module")
+def page() -> bytes:
+    return live_chat_page()
+
+
+def extract(page: bytes):
+    """Feed the page in chunks the way Monitor.get_initial_chat does, stopping once done"""
+    extractor = InitialChatExtractor()
+    for i in range(0, len(page), INITIAL_CHAT_CHUNK_SIZE):
+        if extractor.feed(page[i : i + INITIAL_CHAT_CHUNK_SIZE]):
+            break
+    else:
+        extractor.feed(b"", final=True)
+    return extractor.chat_obj, extractor.key, extractor.context
+
+
+def test_extractor(benchmark, page):
+    chat_obj, key, context = benchmark(extract, page)
+    assert (chat_obj, key, context) == parse_initial_chat_html(page.decode())
+
+
+def test_beautifulsoup(benchmark, page):
+    chat_obj, key, context = benchmark(parse_initial_chat_html, page.decode())
+    assert chat_obj is not None and key is not None and context is not None
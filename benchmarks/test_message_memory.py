@@ -0,0 +1,57 @@
+import tracemalloc
+from dataclasses import dataclass
+
+import pytest
+
+from benchmarks.payloads import AUTHORS, STREAM_START, TEXTS
+from matsuri_monitor import chat
+
+COUNT = 100_000
+
+
+@dataclass
+class DictMessage:
+    """chat.Message as it was before __slots__, for comparison"""
+
+    author: str
+    text: str
+    timestamp: float
+    relative_timestamp: float
+
+
+def build_messages(message_cls: type) -> list:
+    return [
+        message_cls(
+            author=AUTHORS[i % len(AUTHORS)],
+            text=TEXTS[i % len(TEXTS)],
+            timestamp=STREAM_START + i / 20,
+            relative_timestamp=i / 20,
+        )
+        for i in range(COUNT)
+    ]
+
+
+def bytes_per_message(message_cls: type) -> float:
+    """Memory allocated per message kept in a list, including its timestamps"""
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        messages = build_messages(message_cls)
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert len(messages) == COUNT
+    return (after - before) / COUNT
+
+
+@pytest.mark.parametrize(
+    "message_cls", [chat.Message, DictMessage], ids=["slotted", "dict"]
+)
+def test_message_memory(benchmark, message_cls):
+    benchmark.extra_info["bytes_per_message"] = bytes_per_message(message_cls)
+    benchmark(build_messages, message_cls)
+
+
+def test_slots_save_memory():
+    assert bytes_per_message(chat.Message) < bytes_per_message(DictMessage)
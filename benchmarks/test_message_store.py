@@ -0,0 +1,32 @@
+import itertools
+
+import pytest
+
+from benchmarks.payloads import STREAM_START, chat_messages
+from matsuri_monitor import chat
+
+# A poll's worth of messages, some of which arrive late
+BATCH_SIZE = 20
+LATE_MESSAGES = 2
+LATE_BY = 5
+RATE = 20
+
+
+@pytest.mark.parametrize("stored", [10_000, 100_000, 300_000])
+def test_add_batch(benchmark, stored):
+    """Cost of adding one poll's batch, which should not grow with the store"""
+    store = chat.MessageStore()
+    store.add(chat_messages(stored, rate=RATE))
+
+    batch_starts = itertools.count(STREAM_START + stored / RATE, BATCH_SIZE / RATE)
+
+    def next_batch():
+        start = next(batch_starts)
+        batch = chat_messages(BATCH_SIZE, start, RATE, seed=int(start))
+        for message in batch[:LATE_MESSAGES]:
+            message.timestamp -= LATE_BY
+        return (batch,), {}
+
+    benchmark.pedantic(store.add, setup=next_batch, rounds=200)
+
+    assert len(store) > stored
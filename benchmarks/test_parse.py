@@ -0,0 +1,35 @@
+import pytest
+
+from benchmarks.payloads import (
+    STREAM_START,
+    other_action,
+    superchat_action,
+    text_action,
+)
+from matsuri_monitor.clients.monitor import ACTIONS_PATH, traverse
+
+
+def test_parse_actions(benchmark, monitor, continuation):
+    actions = traverse(continuation, ACTIONS_PATH)
+
+    messages = benchmark(monitor.parse_actions, actions)
+
+    assert 0 < len(messages) < len(actions)
+    # Stats are missing when run with --benchmark-disable
+    if benchmark.stats is not None:
+        benchmark.extra_info["actions_per_second"] = (
+            len(actions) / benchmark.stats.stats.mean
+        )
+
+
+@pytest.mark.parametrize(
+    "action",
+    [
+        text_action("viewer", "まつり", STREAM_START),
+        superchat_action("viewer", "まつり", STREAM_START),
+        other_action(STREAM_START),
+    ],
+    ids=["message", "superchat", "other"],
+)
+def test_parse_action(benchmark, monitor, action):
+    benchmark(monitor.parse_action, action)
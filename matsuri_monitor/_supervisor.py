@@ -1,13 +1,16 @@
+import hashlib
 import logging
-from collections import OrderedDict
-from typing import Dict, List
+import os
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
 
+import tornado.escape
 import tornado.gen
 import tornado.ioloop
 import tornado.options
-from cachetools import TTLCache, cached
 
 from matsuri_monitor import chat, clients
+from matsuri_monitor._workers import WorkerPool
 
 tornado.options.define(
     "history-days", default=7, type=int, help="Number of days of history to save"
@@ -15,6 +18,8 @@ tornado.options.define(
 
 logger = logging.getLogger("tornado.general")
 
+ENDED_LOG_SIZE = 1000
+
 
 class Supervisor:
     def __init__(self, interval: float):
@@ -27,10 +32,25 @@ class Supervisor:
         """
         super().__init__()
         self.interval = interval
-        self.api = clients.HoloDex()
+        self.sessions = clients.SessionPool()
+        self.scheduler = clients.RequestScheduler()
+        # With workers, monitors run in worker processes and live_monitors holds their handles
+        num_workers = tornado.options.options.workers
+        self.workers = WorkerPool(num_workers) if num_workers > 0 else None
+        self.api = clients.HoloDex(self.sessions)
         self.live_monitors: Dict[str, clients.Monitor] = OrderedDict()
         self.groupers = chat.Grouper.load()
+        # Report versions and change IDs restart with the process, so ETags and delta cursors
+        # are tagged with a per-process epoch to avoid colliding across restarts
+        self._epoch = os.urandom(8).hex()
+        self._ended: Deque[Tuple[int, str]] = deque(maxlen=ENDED_LOG_SIZE)
+        self._ioloop: tornado.ioloop.IOLoop = None
+        self._subscribers: Set[Callable[[bytes], None]] = set()
+        self._broadcast_change_id = chat.next_change_id()
+        self._broadcast_pending = False
         tornado.options.options.archives_dir.mkdir(exist_ok=True)
+        # Opening the index the first time indexes any existing archives
+        chat.get_archive_index()
 
     async def update(self, current_ioloop: tornado.ioloop.IOLoop = None):
         """Periodic update of overall app state
@@ -50,8 +70,11 @@ class Supervisor:
         # Refresh groupers
         new_groupers = chat.Grouper.load()
         if new_groupers != self.groupers:
-            for monitor in self.live_monitors.values():
-                monitor.report.set_groupers(new_groupers)
+            if self.workers is not None:
+                self.workers.set_groupers()
+            else:
+                for monitor in self.live_monitors.values():
+                    monitor.report.set_groupers(new_groupers)
             self.groupers = new_groupers
 
         # Clean up terminated monitors (including those that terminated with an error)
@@ -66,6 +89,7 @@ class Supervisor:
         for video_id in to_delete:
             self.live_monitors[video_id].terminate()
             del self.live_monitors[video_id]
+            self._ended.append((chat.next_change_id(), video_id))
 
         # Refresh currently live list and find lives to start and terminate
         await self.api.update()
@@ -80,10 +104,15 @@ class Supervisor:
         for video_id in new_lives:
             info = self.api.get_live_info(video_id)
 
-            report = chat.LiveReport(info)
-            report.set_groupers(self.groupers)
+            if self.workers is not None:
+                monitor = self.workers.monitor(info)
+                monitor.report.on_change = self.schedule_broadcast
+            else:
+                report = chat.LiveReport(info)
+                report.set_groupers(self.groupers)
+                report.on_change = self.schedule_broadcast
+                monitor = clients.Monitor(info, report, self.sessions, self.scheduler)
 
-            monitor = clients.Monitor(info, report)
             monitor.start(current_ioloop)
 
             self.live_monitors[video_id] = monitor
@@ -97,21 +126,137 @@ class Supervisor:
 
         logger.info(f"Terminated {len(stopped_lives)} monitors: {list(stopped_lives)}")
 
+        self.schedule_broadcast()
+
         logger.info("[End supervisor update]")
 
-    @cached(TTLCache(1, 5))
-    def live_json(self) -> dict:
-        """JSON object containing reports of all currently live streams"""
+    def stats(self) -> dict:
+        """Runtime statistics of live monitoring"""
+        if self.workers is not None:
+            # Monitors, and so all requests and chat processing, run in the workers
+            return {
+                "live_monitors": len(self.live_monitors),
+                **self.workers.aggregate_stats(),
+                "workers": self.workers.stats(),
+            }
+
         return {
-            "reports": [
-                monitor.report.json()
-                for monitor in self.live_monitors.values()
-                if monitor.is_running
-            ]
+            "live_monitors": len(self.live_monitors),
+            "http": self.sessions.stats(),
+            "scheduler": self.scheduler.stats(),
+            "pipeline": clients.pipeline_stats.stats(),
+            "workers": None,
         }
 
+    def _running_reports(self) -> List[chat.LiveReport]:
+        return [
+            monitor.report
+            for monitor in self.live_monitors.values()
+            if monitor.is_running
+        ]
+
+    def live_etag(self) -> str:
+        """Strong ETag for live_json, which changes whenever any live report changes"""
+        hasher = hashlib.sha1(self._epoch.encode())
+        for report in self._running_reports():
+            hasher.update(f"{report.info.id}:{report.version};".encode())
+        return f'"{hasher.hexdigest()}"'
+
+    def live_json(self) -> bytes:
+        """Encoded JSON object containing reports of all currently live streams"""
+        reports = [report.json_bytes() for report in self._running_reports()]
+        return b'{"reports": [' + b", ".join(reports) + b"]}"
+
+    def _parse_cursor(self, cursor: str) -> Optional[int]:
+        """Change ID encoded in a delta cursor, or None if it is invalid or from another process"""
+        epoch, _, change_id = cursor.partition("-")
+        if epoch != self._epoch or not change_id.isdigit():
+            return None
+        change_id = int(change_id)
+        # Cursors older than the retained end-of-stream log could miss ended streams
+        if len(self._ended) == self._ended.maxlen and change_id < self._ended[0][0]:
+            return None
+        return change_id
+
+    def live_delta(self, cursor: str) -> bytes:
+        """Encoded JSON object containing changes to live reports since the given cursor
+
+        The response carries a new cursor for the next request. If the given cursor cannot be used,
+        the response holds all live reports in full and is marked as such.
+        """
+        since = self._parse_cursor(cursor)
+        # Taken before reading any report, so changes racing with this request are resent next time
+        return self._encode_delta(since, chat.next_change_id())
+
+    def _encode_delta(self, since: Optional[int], change_id: int) -> bytes:
+        new_cursor = f"{self._epoch}-{change_id}"
+
+        if since is None:
+            reports = [report.json_bytes() for report in self._running_reports()]
+            return (
+                b'{"cursor": '
+                + tornado.escape.utf8(tornado.escape.json_encode(new_cursor))
+                + b', "full": true, "reports": ['
+                + b", ".join(reports)
+                + b'], "ended": []}'
+            )
+
+        reports = [report.delta(since) for report in self._running_reports()]
+        ended = [video_id for ended_id, video_id in self._ended if ended_id > since]
+        ended += [
+            video_id
+            for video_id, monitor in self.live_monitors.items()
+            if not monitor.is_running
+        ]
+
+        return tornado.escape.utf8(
+            tornado.escape.json_encode(
+                {
+                    "cursor": new_cursor,
+                    "full": False,
+                    "reports": [report for report in reports if report is not None],
+                    "ended": ended,
+                }
+            )
+        )
+
+    def subscribe(self, callback: Callable[[bytes], None]):
+        """Register a callback that receives each broadcast delta of the live reports"""
+        self._subscribers.add(callback)
+
+    def unsubscribe(self, callback: Callable[[bytes], None]):
+        """Remove a callback registered with subscribe"""
+        self._subscribers.discard(callback)
+
+    def schedule_broadcast(self):
+        """Schedule a broadcast of changes to live reports (safe to call from any thread)
+
+        Calls made before the broadcast runs are coalesced into it.
+        """
+        if self._ioloop is None or self._broadcast_pending:
+            return
+        self._broadcast_pending = True
+        self._ioloop.add_callback(self._broadcast)
+
+    def _broadcast(self):
+        """Send one delta since the last broadcast, encoded once, to all subscribers"""
+        self._broadcast_pending = False
+        since = self._broadcast_change_id
+        self._broadcast_change_id = chat.next_change_id()
+
+        if len(self._subscribers) == 0:
+            return
+
+        payload = self._encode_delta(since, self._broadcast_change_id)
+
+        for callback in list(self._subscribers):
+            callback(payload)
+
     def start(self, current_ioloop: tornado.ioloop.IOLoop):
         """Begin update loop"""
+        self._ioloop = current_ioloop
+        if self.workers is not None:
+            self.workers.start(current_ioloop)
 
         async def update_loop():
             while True:
@@ -0,0 +1,396 @@
+import functools
+import logging
+import multiprocessing as mp
+import threading
+from multiprocessing.connection import Connection
+from typing import Callable, Dict, List, Optional, Set
+
+import tornado.ioloop
+import tornado.log
+import tornado.options
+
+from matsuri_monitor import chat, clients
+from matsuri_monitor.clients.pipeline import STAGES
+from matsuri_monitor.clients.scheduler import (
+    HOST_CONCURRENCY,
+    REQUEST_BURST,
+    REQUEST_RATE,
+)
+
+tornado.options.define(
+    "workers",
+    default=0,
+    type=int,
+    help="Number of worker processes to run monitors in (0 runs them in the server process)",
+)
+
+logger = logging.getLogger("tornado.general")
+
+# Seconds between statistics reports from each worker
+STATS_INTERVAL = 10
+
+# Messages in both directions are (kind, video_id, payload) tuples
+# Server to worker: ("start", video_id, VideoInfo), ("terminate", video_id, None),
+#                   ("groupers", None, None)
+# Worker to server: ("delta", video_id, delta dict), ("stopped", video_id, None),
+#                   ("stats", None, stats dict)
+
+
+def _read_loop(
+    conn: Connection,
+    ioloop: tornado.ioloop.IOLoop,
+    handler: Callable[[Optional[tuple]], None],
+):
+    """Pass each message received on the pipe to the handler on the IOLoop, then None at EOF"""
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            ioloop.add_callback(handler, None)
+            return
+        ioloop.add_callback(handler, message)
+
+
+def _start_reader(
+    conn: Connection,
+    ioloop: tornado.ioloop.IOLoop,
+    handler: Callable[[Optional[tuple]], None],
+):
+    threading.Thread(
+        target=_read_loop, args=(conn, ioloop, handler), daemon=True
+    ).start()
+
+
+class MonitorWorker:
+    def __init__(
+        self, conn: Connection, ioloop: tornado.ioloop.IOLoop, num_workers: int
+    ):
+        """Runs monitors in a worker process and sends their report deltas to the server
+
+        Groupers are loaded here rather than received from the server, since their conditions
+        are closures that cannot be pickled.
+
+        Parameters
+        ----------
+        conn
+            Pipe to the server process
+        ioloop
+            IOLoop of the worker process
+        num_workers
+            Total number of workers, which share the request rate limits evenly
+        """
+        self.conn = conn
+        self.ioloop = ioloop
+        self.groupers = chat.Grouper.load()
+        self.sessions = clients.SessionPool()
+        self.scheduler = clients.RequestScheduler(
+            rate=REQUEST_RATE / num_workers,
+            burst=max(REQUEST_BURST // num_workers, 1),
+            host_concurrency=max(HOST_CONCURRENCY // num_workers, 1),
+        )
+        self.monitors: Dict[str, clients.Monitor] = {}
+        self._cursors: Dict[str, int] = {}
+        self._changed: Set[str] = set()
+        self._send_pending = False
+        self._send_lock = threading.Lock()
+
+    def handle(self, message: Optional[tuple]):
+        """Handle a message from the server"""
+        if message is None:
+            logger.warning("Server process closed the pipe, stopping worker")
+            self.ioloop.stop()
+            return
+
+        kind, video_id, payload = message
+
+        if kind == "start":
+            self.start_monitor(payload)
+        elif kind == "terminate":
+            self._cursors.pop(video_id, None)
+            monitor = self.monitors.pop(video_id, None)
+            if monitor is not None:
+                monitor.terminate()
+        elif kind == "groupers":
+            self.groupers = chat.Grouper.load()
+            for monitor in self.monitors.values():
+                monitor.report.set_groupers(self.groupers)
+
+    def start_monitor(self, info: chat.VideoInfo):
+        report = chat.LiveReport(info)
+        report.set_groupers(self.groupers)
+        report.on_change = functools.partial(self.schedule_send, info.id)
+
+        monitor = clients.Monitor(info, report, self.sessions, self.scheduler)
+        self.monitors[info.id] = monitor
+        self._cursors[info.id] = 0
+        monitor.start(self.ioloop)
+
+        self.ioloop.add_callback(self._watch, monitor)
+        self.schedule_send(info.id)
+
+    async def _watch(self, monitor: clients.Monitor):
+        """Tell the server when the monitor stops, after its last changes"""
+        await monitor.wait_stopped()
+        self.send_deltas()
+        self.conn.send(("stopped", monitor.info.id, None))
+
+    def schedule_send(self, video_id: str):
+        """Schedule sending changes to a report (safe to call from any thread)
+
+        Calls made before the changes are sent are coalesced, like Supervisor broadcasts.
+        """
+        with self._send_lock:
+            self._changed.add(video_id)
+            if self._send_pending:
+                return
+            self._send_pending = True
+        self.ioloop.add_callback(self.send_deltas)
+
+    def send_deltas(self):
+        """Send the deltas of all changed reports since they were last sent"""
+        with self._send_lock:
+            changed = self._changed
+            self._changed = set()
+            self._send_pending = False
+
+        for video_id in changed:
+            monitor = self.monitors.get(video_id)
+            if monitor is None:
+                continue
+
+            # Taken before reading the report, so racing changes are sent next time
+            change_id = chat.next_change_id()
+            delta = monitor.report.delta(self._cursors[video_id])
+            self._cursors[video_id] = change_id
+
+            if delta is not None:
+                self.conn.send(("delta", video_id, delta))
+
+    def send_stats(self):
+        """Send this worker's HTTP, scheduler and pipeline statistics to the server"""
+        stats = {
+            "http": self.sessions.stats(),
+            "scheduler": self.scheduler.stats(),
+            "pipeline": clients.pipeline_stats.stats(),
+        }
+        self.conn.send(("stats", None, stats))
+
+
+def worker_main(conn: Connection, options: dict, num_workers: int):
+    """Entry point of a worker process"""
+    for name, value in options.items():
+        if name in tornado.options.options:
+            setattr(tornado.options.options, name, value)
+    tornado.log.enable_pretty_logging()
+
+    ioloop = tornado.ioloop.IOLoop.current()
+    worker = MonitorWorker(conn, ioloop, num_workers)
+    _start_reader(conn, ioloop, worker.handle)
+    tornado.ioloop.PeriodicCallback(worker.send_stats, STATS_INTERVAL * 1000).start()
+
+    # Runs until the server closes the pipe, or is interrupted along with the server
+    try:
+        ioloop.start()
+    except KeyboardInterrupt:
+        pass
+
+    ioloop.run_sync(worker.sessions.close)
+
+
+class MonitorHandle:
+    def __init__(self, info: chat.VideoInfo, worker: "WorkerProcess"):
+        """Server-side stand-in for a Monitor running in a worker process
+
+        Parameters
+        ----------
+        info
+            VideoInfo for the monitored video
+        worker
+            Worker process running the monitor
+        """
+        self.info = info
+        self.report = chat.ReportMirror(info)
+        self.worker = worker
+        self.running = True
+
+    @property
+    def is_running(self):
+        return self.running
+
+    def start(self, current_ioloop: tornado.ioloop.IOLoop = None):
+        """Start the monitor in its worker process"""
+        logger.info(
+            f"Begin monitoring video_id={self.info.id} in worker {self.worker.name}"
+        )
+        self.worker.send(("start", self.info.id, self.info))
+
+    def terminate(self):
+        """Signal the monitor to terminate and save its report"""
+        logger.info(f"Sending terminate signal for video_id={self.info.id}")
+        self.worker.send(("terminate", self.info.id, None))
+
+
+class WorkerProcess:
+    def __init__(
+        self,
+        name: str,
+        ioloop: tornado.ioloop.IOLoop,
+        options: dict,
+        num_workers: int,
+    ):
+        """Spawns a worker process and applies the report deltas it sends back
+
+        Parameters
+        ----------
+        name
+            Name of the worker, for logs
+        ioloop
+            IOLoop of the server process, on which deltas are applied
+        options
+            Command line options, which spawned processes do not inherit
+        num_workers
+            Total number of workers
+        """
+        self.name = name
+        self.monitors: Dict[str, MonitorHandle] = {}
+        self.alive = True
+        self.worker_stats: Optional[dict] = None
+
+        context = mp.get_context("spawn")
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=worker_main,
+            args=(child_conn, options, num_workers),
+            name=f"monitor-worker-{name}",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+        _start_reader(self.conn, ioloop, self.handle)
+
+    def send(self, message: tuple):
+        try:
+            self.conn.send(message)
+        except OSError:
+            logger.exception(f"Failed to send {message[0]} to worker {self.name}")
+
+    def handle(self, message: Optional[tuple]):
+        """Handle a message from the worker"""
+        if message is None:
+            logger.error(
+                f"Worker {self.name} exited, stopping {len(self.monitors)} monitors"
+            )
+            self.alive = False
+            for monitor in self.monitors.values():
+                monitor.running = False
+            self.monitors.clear()
+            return
+
+        kind, video_id, payload = message
+
+        if kind == "stats":
+            self.worker_stats = payload
+            return
+
+        monitor = self.monitors.get(video_id)
+        if monitor is None:
+            return
+
+        if kind == "delta":
+            monitor.report.apply(payload)
+        elif kind == "stopped":
+            monitor.running = False
+            del self.monitors[video_id]
+
+    def stats(self) -> dict:
+        return {
+            "pid": self.process.pid,
+            "alive": self.alive,
+            "monitors": len(self.monitors),
+        }
+
+
+class WorkerPool:
+    def __init__(self, num_workers: int):
+        """Pool of worker processes that monitors are spread across
+
+        Parameters
+        ----------
+        num_workers
+            Number of worker processes
+        """
+        self.num_workers = num_workers
+        self.workers: List[WorkerProcess] = []
+        self._ioloop: tornado.ioloop.IOLoop = None
+        self._spawned = 0
+
+    def start(self, current_ioloop: tornado.ioloop.IOLoop):
+        """Spawn the worker processes"""
+        self._ioloop = current_ioloop
+        self.workers = [self._spawn() for _ in range(self.num_workers)]
+
+    def _spawn(self) -> WorkerProcess:
+        self._spawned += 1
+        return WorkerProcess(
+            str(self._spawned),
+            self._ioloop,
+            tornado.options.options.as_dict(),
+            self.num_workers,
+        )
+
+    def monitor(self, info: chat.VideoInfo) -> MonitorHandle:
+        """Create a monitor handle on the least loaded worker (call start to run it)"""
+        # Replace workers that exited; their monitors are restarted by the Supervisor
+        self.workers = [
+            worker if worker.alive else self._spawn() for worker in self.workers
+        ]
+
+        worker = min(self.workers, key=lambda worker: len(worker.monitors))
+        handle = MonitorHandle(info, worker)
+        worker.monitors[info.id] = handle
+        return handle
+
+    def set_groupers(self):
+        """Have all workers reload groupers"""
+        for worker in self.workers:
+            worker.send(("groupers", None, None))
+
+    def stats(self) -> List[dict]:
+        return [worker.stats() for worker in self.workers]
+
+    def aggregate_stats(self) -> dict:
+        """HTTP, scheduler and pipeline statistics summed over the latest report of each worker"""
+        reports = [w.worker_stats for w in self.workers if w.worker_stats is not None]
+
+        http = _sum_counters([report["http"] for report in reports])
+
+        schedulers = [report["scheduler"] for report in reports]
+        scheduler = _sum_counters(schedulers, ["granted", "waiting"])
+        scheduler["mean_wait"] = _weighted_mean(schedulers, "mean_wait", "granted")
+
+        pipelines = [report["pipeline"] for report in reports]
+        pipeline = _sum_counters(pipelines, ["batches", "coalesced", "shed_actions"])
+        pipeline["stages"] = {}
+        for stage in STAGES:
+            stages = [report["stages"][stage] for report in pipelines]
+            pipeline["stages"][stage] = {
+                "count": sum(stats["count"] for stats in stages),
+                "mean_ms": _weighted_mean(stages, "mean_ms", "count"),
+                "max_ms": max((stats["max_ms"] for stats in stages), default=0.0),
+            }
+
+        return {"http": http, "scheduler": scheduler, "pipeline": pipeline}
+
+
+def _sum_counters(reports: List[dict], keys: Optional[List[str]] = None) -> dict:
+    if keys is None:
+        keys = list(reports[0]) if len(reports) > 0 else []
+    return {key: sum(report[key] for report in reports) for key in keys}
+
+
+def _weighted_mean(reports: List[dict], key: str, weight_key: str) -> float:
+    total_weight = sum(report[weight_key] for report in reports)
+    if total_weight == 0:
+        return 0.0
+    return sum(report[key] * report[weight_key] for report in reports) / total_weight
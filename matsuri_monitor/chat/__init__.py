@@ -1,5 +1,8 @@
-from matsuri_monitor.chat.group_list import GroupList
-from matsuri_monitor.chat.grouper import Grouper
+from matsuri_monitor.chat.archive_index import ArchiveIndex, get_archive_index
+from matsuri_monitor.chat.group_list import ChangeLog, GroupList, next_change_id
+from matsuri_monitor.chat.grouper import Grouper, GrouperMatcher
 from matsuri_monitor.chat.info import ChannelInfo, VideoInfo
 from matsuri_monitor.chat.live_report import LiveReport
 from matsuri_monitor.chat.message import Message, SuperChat
+from matsuri_monitor.chat.message_store import MessageStore
+from matsuri_monitor.chat.report_mirror import ReportMirror
@@ -0,0 +1,185 @@
+import gzip
+import json
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import tornado.options
+
+logger = logging.getLogger("tornado.general")
+
+INDEX_FILENAME = "archive_index.sqlite3"
+# Stored as the index file's user_version; indexes with another version are rebuilt
+SCHEMA_VERSION = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    name TEXT PRIMARY KEY,
+    video_id TEXT NOT NULL,
+    title TEXT,
+    channel_name TEXT,
+    num_groups INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    seq INTEGER NOT NULL
+)
+"""
+
+# Last sequence number given out, kept apart from the reports so it never goes back when the
+# latest report is removed or the reports are reindexed
+COUNTER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+)
+"""
+
+
+def is_report_path(path: Path) -> bool:
+    """Whether the given path in the archives directory is a report (not a chat dump or index)"""
+    return path.name.endswith(".json.gz") and "_chat" not in path.name
+
+
+class ArchiveIndex:
+    def __init__(self, archives_dir: Path):
+        """SQLite catalog of the reports saved in an archives directory
+
+        Report file names start with the ISO start time of the stream, so name order is
+        chronological and date-range queries are range scans on the primary key. Each entry also
+        has a sequence number, increased whenever a report is added or rewritten, to find the
+        reports that changed since an earlier query.
+
+        Parameters
+        ----------
+        archives_dir
+            Directory holding archived reports, where the index file is also kept
+        """
+        self.archives_dir = archives_dir
+        self._lock = threading.Lock()
+
+        index_path = archives_dir / INDEX_FILENAME
+        self._conn = sqlite3.connect(str(index_path), check_same_thread=False)
+
+        (user_version,) = self._conn.execute("PRAGMA user_version").fetchone()
+        if user_version != SCHEMA_VERSION:
+            self.rebuild()
+
+    def rebuild(self):
+        """Index every report in the archives directory (one directory scan)
+
+        The index is replaced in a single transaction, which also records the schema version, so
+        an interrupted rebuild is started over on the next run. Reports that fail to load are
+        logged and left out.
+        """
+        report_paths = list(filter(is_report_path, self.archives_dir.iterdir()))
+        logger.info(f"Indexing {len(report_paths)} archived reports")
+
+        # The connection commits when the block completes and rolls back if it raises
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DROP TABLE IF EXISTS reports")
+            self._conn.execute(SCHEMA)
+            self._conn.execute(COUNTER_SCHEMA)
+            self._conn.execute("INSERT OR IGNORE INTO counters VALUES ('seq', 0)")
+
+            for report_path in report_paths:
+                try:
+                    with gzip.open(report_path, "rt") as report_file:
+                        self._insert(report_path, json.load(report_file))
+                except Exception:
+                    logger.exception(
+                        f"Failed to index archived report {report_path.name}"
+                    )
+
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def add(self, report_path: Path, report_json: dict):
+        """Add or update the entry for a report file, giving it the next sequence number"""
+        with self._lock:
+            self._insert(report_path, report_json)
+            self._conn.commit()
+
+    def _insert(self, report_path: Path, report_json: dict):
+        stat = report_path.stat()
+        num_groups = sum(len(gl["groups"]) for gl in report_json["group_lists"])
+
+        self._conn.execute("UPDATE counters SET value = value + 1 WHERE name = 'seq'")
+        self._conn.execute(
+            "INSERT OR REPLACE INTO reports VALUES (?, ?, ?, ?, ?, ?, ?, "
+            "(SELECT value FROM counters WHERE name = 'seq'))",
+            (
+                report_path.name,
+                report_json["id"],
+                report_json.get("title"),
+                report_json.get("channel_name"),
+                num_groups,
+                stat.st_size,
+                stat.st_mtime,
+            ),
+        )
+
+    def remove(self, name: str):
+        """Remove the entry for a report file name"""
+        with self._lock:
+            self._conn.execute("DELETE FROM reports WHERE name = ?", (name,))
+            self._conn.commit()
+
+    def names_since(
+        self, since: str, after: Optional[str] = None, limit: Optional[int] = None
+    ) -> List[str]:
+        """Names of reports starting on or after the given ISO date, in chronological order
+
+        Parameters
+        ----------
+        since
+            ISO date (or any prefix of a report file name) to start from
+        after
+            If given, only return names after this one (a cursor from a previous page)
+        limit
+            Maximum number of names to return
+        """
+        lower = since if after is None else max(since, after)
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name FROM reports WHERE name > ? ORDER BY name LIMIT ?",
+                (lower, -1 if limit is None else limit),
+            ).fetchall()
+
+        return [row[0] for row in rows]
+
+    def last_seq(self) -> int:
+        """Sequence number of the latest change, to pass to names_changed later"""
+        with self._lock:
+            (seq,) = self._conn.execute(
+                "SELECT value FROM counters WHERE name = 'seq'"
+            ).fetchone()
+        return seq
+
+    def names_changed(self, since: str, after_seq: int) -> List[str]:
+        """Names of reports starting on or after the given ISO date, added or rewritten after the
+        given sequence number, in chronological order
+
+        Unlike a name cursor, this finds reports of earlier streams that were archived later and
+        reports rewritten since (e.g. by combine_reports).
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name FROM reports WHERE name > ? AND seq > ? ORDER BY name",
+                (since, after_seq),
+            ).fetchall()
+
+        return [row[0] for row in rows]
+
+
+_indexes: Dict[Path, ArchiveIndex] = {}
+
+
+def get_archive_index() -> ArchiveIndex:
+    """Return the shared index for the configured archives directory"""
+    archives_dir = tornado.options.options.archives_dir
+    if archives_dir not in _indexes:
+        _indexes[archives_dir] = ArchiveIndex(archives_dir)
+    return _indexes[archives_dir]
@@ -0,0 +1,33 @@
+import gzip
+import json
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from matsuri_monitor.chat.message import Message
+
+
+def append_messages(path: Path, messages: Iterable[Message]):
+    """Append messages to a gzipped JSON Lines chat file
+
+    Each call writes a separate gzip member, so appending never rewrites existing data.
+    """
+    with gzip.open(path, "at", encoding="utf-8") as chat_file:
+        for message in messages:
+            chat_file.write(json.dumps(message.json(), ensure_ascii=False))
+            chat_file.write("\n")
+
+
+def read_messages(path: Path) -> Iterator[Message]:
+    """Stream messages back from a chat file written by append_messages
+
+    Older chat dumps written as a single JSON array (*_chat.json.gz) are also accepted, but are
+    loaded whole.
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as chat_file:
+        if path.name.endswith(".json.gz"):
+            for message_json in json.load(chat_file):
+                yield Message.from_json(message_json)
+            return
+
+        for line in chat_file:
+            yield Message.from_json(json.loads(line))
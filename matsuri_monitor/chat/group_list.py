@@ -1,8 +1,43 @@
-from typing import Callable, List
+import itertools
+from bisect import bisect_left, bisect_right
+from typing import Iterable, List, Optional, Set
 
 from matsuri_monitor.chat.grouper import Grouper
 from matsuri_monitor.chat.message import Message
 
+_change_ids = itertools.count(1)
+
+
+def next_change_id() -> int:
+    """Return a new ID from the process-wide, increasing sequence used to order report changes"""
+    return next(_change_ids)
+
+
+class ChangeLog:
+    def __init__(self):
+        """Log of changes to a list, each replacing the list's items from some index onward
+
+        The log only keeps entries that are not superseded by a later change to an earlier item,
+        so it stays increasing in both change ID and index, and at most one entry per item.
+        """
+        self._change_ids: List[int] = []
+        self._change_starts: List[int] = []
+
+    def log(self, start: int):
+        """Record that items from the given index onward have changed"""
+        while len(self._change_starts) > 0 and self._change_starts[-1] >= start:
+            self._change_ids.pop()
+            self._change_starts.pop()
+        self._change_ids.append(next_change_id())
+        self._change_starts.append(start)
+
+    def changed_since(self, change_id: int) -> Optional[int]:
+        """Index of the first item changed after the given change ID, if any"""
+        i = bisect_right(self._change_ids, change_id)
+        if i == len(self._change_ids):
+            return None
+        return self._change_starts[i]
+
 
 class GroupList:
     def __init__(self, grouper: Grouper):
@@ -14,45 +49,132 @@ class GroupList:
             Grouper used to define this group list
         """
         self._groups = []
+        self._group_starts: List[int] = []
+        self._matched: List[Message] = []
+        self._matched_timestamps: List[float] = []
+        self._last_authors: Set[str] = set()
+        self._qualified: List[List[Message]] = []
+        self._qualified_indices: List[int] = []
         self.grouper = grouper
         self.description = grouper.description
         self.notify = grouper.notify
         self.last_timestamp = -float("inf")
-        self.last_message_index = 0
+        self.watermark = -float("inf")
+        self.version = 0
+        self._changes = ChangeLog()
+
+    def update(self, messages: Iterable[Message]):
+        """Compute new groups from the given new Messages
 
-    def update(self, messages: List[Message]):
-        """Compute new groups from the given list of Messages"""
-        for message in messages[self.last_message_index :]:
+        Messages are expected in timestamp order. Messages older than the watermark (the newest
+        timestamp seen so far) reopen the group they land in and regroup from there.
+        """
+        for message in messages:
             if self.grouper.condition(message):
-                message_interval = message.timestamp - self.last_timestamp
-                if message_interval <= self.grouper.interval:
-                    self.add_to_last_group(message)
-                else:
-                    self.add_to_new_group(message)
+                self.add_match(message)
+
+    def add_match(self, message: Message):
+        """Add a message that satisfies this list's grouper condition"""
+        timestamp = message.timestamp
+
+        if timestamp >= self.watermark:
+            self._matched.append(message)
+            self._matched_timestamps.append(timestamp)
+            self.watermark = timestamp
+            self.add_to_groups(len(self._matched) - 1)
+        else:
+            i = bisect_right(self._matched_timestamps, timestamp)
+            self._matched.insert(i, message)
+            self._matched_timestamps.insert(i, timestamp)
+            self.regroup_from(i)
 
-        self.last_message_index = len(messages)
+    def regroup_from(self, match_index: int):
+        """Discard and recompute groups from the one containing the given matched message"""
+        # The group whose span the message was inserted into is the last one starting before it
+        group_index = max(bisect_left(self._group_starts, match_index) - 1, 0)
 
-    def add_to_new_group(self, message: Message):
+        if group_index < len(self._group_starts):
+            start = self._group_starts[group_index]
+        else:
+            start = match_index
+
+        del self._groups[group_index:]
+        del self._group_starts[group_index:]
+
+        qualified_index = bisect_left(self._qualified_indices, group_index)
+        del self._qualified[qualified_index:]
+        del self._qualified_indices[qualified_index:]
+
+        if len(self._groups) > 0:
+            self.last_timestamp = self._groups[-1][-1].timestamp
+            if self.grouper.unique_author:
+                self._last_authors = {other.author for other in self._groups[-1]}
+        else:
+            self.last_timestamp = -float("inf")
+            self._last_authors = set()
+
+        for i in range(start, len(self._matched)):
+            self.add_to_groups(i)
+
+        self.log_change(qualified_index)
+
+    def add_to_groups(self, match_index: int):
+        """Group the matched message at the given index, which must follow all grouped messages"""
+        message = self._matched[match_index]
+        message_interval = message.timestamp - self.last_timestamp
+        if message_interval <= self.grouper.interval:
+            self.add_to_last_group(message, match_index)
+        else:
+            self.add_to_new_group(message, match_index)
+
+    def add_to_new_group(self, message: Message, match_index: int):
         """Add message to a new group"""
         self._groups.append([message])
+        self._group_starts.append(match_index)
         self.last_timestamp = message.timestamp
+        self.check_qualified(0)
 
-    def add_to_last_group(self, message: Message):
+        # Only the last group can still grow, so only its authors need to be tracked
+        if self.grouper.unique_author:
+            self._last_authors = {message.author}
+
+    def add_to_last_group(self, message: Message, match_index: int):
         """Add message to current last group"""
         if len(self._groups) == 0:
-            return self.add_to_new_group(message)
-        if self.grouper.unique_author and any(
-            message.author == other.author for other in self._groups[-1]
-        ):
-            return
+            return self.add_to_new_group(message, match_index)
+        if self.grouper.unique_author:
+            if message.author in self._last_authors:
+                return
+            self._last_authors.add(message.author)
         self._groups[-1].append(message)
         self.last_timestamp = message.timestamp
+        self.check_qualified(len(self._groups[-1]) - 1)
+
+    def check_qualified(self, previous_len: int):
+        """Add the last group to the qualifying groups if it just reached the minimum length"""
+        group = self._groups[-1]
+        min_len = self.grouper.min_len
+        if len(group) < min_len:
+            return
+        if previous_len == 0 or previous_len < min_len:
+            self._qualified.append(group)
+            self._qualified_indices.append(len(self._groups) - 1)
+        self.log_change(len(self._qualified) - 1)
+
+    def log_change(self, qualified_index: int):
+        """Record that qualifying groups from the given index onward have changed"""
+        self._changes.log(qualified_index)
+        self.version += 1
+
+    def changed_since(self, change_id: int) -> Optional[int]:
+        """Index of the first qualifying group changed after the given change ID, if any"""
+        return self._changes.changed_since(change_id)
 
     @property
     def groups(self) -> List[List[Message]]:
-        """Return filtered groups."""
-        return list(filter(lambda g: len(g) >= self.grouper.min_len, self._groups))
+        """Return groups that meet the grouper's minimum length (do not modify)"""
+        return self._qualified
 
     def __len__(self):
         """Number of groups in this list"""
-        return len(self.groups)
+        return len(self._qualified)
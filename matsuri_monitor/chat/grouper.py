@@ -2,9 +2,9 @@ from __future__ import annotations
 
 import json
 import re
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Callable, List
+from typing import Callable, Dict, List
 
 import jsonschema
 import tornado.options
@@ -38,6 +38,10 @@ GROUPER_SCHEMA = {
     },
 }
 
+# Named groups, backreferences and conditional references would change meaning if renumbered
+# inside the combined pattern, and global inline flags would apply to the other groupers too
+_UNCOMBINABLE_RE = re.compile(r"\(\?P[<=]|\\[1-9]|\(\?\(|\(\?[aiLmsux]+\)")
+
 
 def _regex_condition(value: str) -> Callable[[Message], bool]:
     """Creates a condition that is true when message text matches the given regex"""
@@ -62,7 +66,9 @@ def _username_condition(value: str) -> Callable[[Message], bool]:
 class Grouper:
     """Defines a grouper used to group chat messages for a report"""
 
-    condition: Callable
+    type: str
+    value: str
+    condition: Callable = field(compare=False, repr=False)
     description: str
     interval: float
     min_len: int
@@ -91,6 +97,8 @@ class Grouper:
                 continue
             groupers.append(
                 cls(
+                    type=condition_type,
+                    value=condition_value,
                     condition=condition,
                     description=description,
                     interval=gdef["interval"],
@@ -102,3 +110,59 @@ class Grouper:
             )
 
         return groupers
+
+
+class GrouperMatcher:
+    def __init__(self, groupers: List[Grouper]):
+        """Matches messages against a list of groupers at once
+
+        Regex groupers are combined into a single alternation, so a message that matches none of
+        them (the vast majority of chat) is rejected with one scan. Only messages that hit the
+        combined pattern are checked against each regex individually. Username groupers are
+        indexed by author, so they cost a single dict lookup per message.
+
+        Parameters
+        ----------
+        groupers
+            Groupers to match against; matches are reported as indices into this list
+        """
+        self.groupers = groupers
+        self._combined = None
+        self._combined_indices = []
+        self._separate_indices = []
+        self._author_indices: Dict[str, List[int]] = {}
+
+        alternatives = []
+
+        for i, grouper in enumerate(groupers):
+            if grouper.type == "username":
+                self._author_indices.setdefault(grouper.value, []).append(i)
+                continue
+            if grouper.type != "regex" or _UNCOMBINABLE_RE.search(grouper.value):
+                self._separate_indices.append(i)
+                continue
+            alternatives.append(f"(?:{grouper.value})")
+            self._combined_indices.append(i)
+
+        if len(alternatives) > 0:
+            try:
+                self._combined = re.compile("|".join(alternatives), flags=re.IGNORECASE)
+            except re.error:
+                self._separate_indices += self._combined_indices
+                self._combined_indices = []
+
+    def match(self, message: Message) -> List[int]:
+        """Return indices of all groupers whose condition the given message satisfies"""
+        matches = list(self._author_indices.get(message.author, ()))
+
+        if self._combined is not None:
+            if self._combined.search(message.text) is not None:
+                for i in self._combined_indices:
+                    if self.groupers[i].condition(message):
+                        matches.append(i)
+
+        for i in self._separate_indices:
+            if self.groupers[i].condition(message):
+                matches.append(i)
+
+        return matches
@@ -1,17 +1,23 @@
 import gzip
 import json
 import multiprocessing as mp
+import tempfile
 from datetime import datetime
-from itertools import groupby
 from pathlib import Path
-from typing import List
+from typing import Callable, Iterable, List, Optional
 
+import tornado.escape
+import tornado.ioloop
 import tornado.options
 
-from matsuri_monitor.chat.group_list import GroupList
-from matsuri_monitor.chat.grouper import Grouper
+from matsuri_monitor.chat.archive_index import get_archive_index
+from matsuri_monitor.chat.chat_file import append_messages
+from matsuri_monitor.chat.group_list import GroupList, next_change_id
+from matsuri_monitor.chat.grouper import Grouper, GrouperMatcher
 from matsuri_monitor.chat.info import VideoInfo
 from matsuri_monitor.chat.message import Message
+from matsuri_monitor.chat.message_store import MessageStore
+from matsuri_monitor.chat.report_mirror import ReportMirror
 
 SAVE_ORGS = ["Hololive"]
 
@@ -27,6 +33,21 @@ tornado.options.define(
     type=bool,
     help="Also dump all stream comments to archive dir",
 )
+tornado.options.define(
+    "chat-window",
+    default=False,
+    type=bool,
+    help="Keep only recent stream comments in memory and spill older ones to spool dir",
+)
+tornado.options.define(
+    "spool-dir",
+    default=Path(tempfile.gettempdir()) / "matsuri_monitor",
+    type=Path,
+    help="Path to spill stream comments to when --chat-window is set",
+)
+
+# Seconds of chat kept in memory beyond the longest grouper interval when spilling
+WINDOW_MARGIN = 60
 
 
 def combine_reports(report1: dict, report2: dict):
@@ -57,6 +78,18 @@ def combine_reports(report1: dict, report2: dict):
     return new_report
 
 
+def _group_json(group: List[Message]) -> List[dict]:
+    return [
+        {
+            "author": message.author,
+            "text": message.text,
+            "timestamp": message.timestamp,
+            "relative_timestamp": message.relative_timestamp,
+        }
+        for message in group
+    ]
+
+
 class LiveReport:
     def __init__(self, info: VideoInfo):
         """init
@@ -69,105 +102,229 @@ class LiveReport:
         self.info = info
         self.group_lock = mp.Lock()
         self.group_lists: List[GroupList] = []
+        self.matcher = GrouperMatcher([])
         self.message_lock = mp.Lock()
-        self.messages: List[Message] = []
+
+        self.dump_chat = (
+            tornado.options.options.dump_chat and info.channel.org in SAVE_ORGS
+        )
+        self._dump_pending: List[Message] = []
+        # Held while writing the dump, so flushes from different threads append in order
+        self._dump_lock = mp.Lock()
+
+        if tornado.options.options.chat_window:
+            spool_dir = tornado.options.options.spool_dir
+            spool_dir.mkdir(parents=True, exist_ok=True)
+            self.messages = MessageStore(spill_path=spool_dir / f"{info.id}.jsonl.gz")
+        else:
+            self.messages = MessageStore()
+        self._version = 0
+        self.reset_change_id = next_change_id()
+        self.on_change: Optional[Callable[[], None]] = None
+
+        # Groups may be computed on other threads, so the IOLoop serves a copy of the report
+        # that is only updated on the IOLoop, from deltas published after each change
+        self._ioloop = tornado.ioloop.IOLoop.current()
+        self._view = ReportMirror(info)
+        self._published_change_id = 0
 
     def set_groupers(self, groupers: List[Grouper]):
         """Set the groupers used to generate this report"""
-        with self.message_lock:
-            messages = self.messages
-
         include = lambda g: self.info.channel.id not in g.skip_channels
-        with self.group_lock:
+        with self.message_lock, self.group_lock:
             self.group_lists = list(map(GroupList, filter(include, groupers)))
-            for group_list in self.group_lists:
-                group_list.update(messages)
+            self.matcher = GrouperMatcher([gl.grouper for gl in self.group_lists])
+            self._dispatch(self.messages)
+            self._version += 1
+            self.reset_change_id = next_change_id()
+            self._publish()
+
+            intervals = [gl.grouper.interval for gl in self.group_lists]
+            self.messages.window = max(intervals, default=0) + WINDOW_MARGIN
 
     def add_messages(self, new_messages: List[Message]):
         """Add new messages and recompute groups from them"""
         with self.message_lock:
-            self.messages.extend(new_messages)
-
-            # Sort and deduplicate
-            self.messages.sort(key=lambda msg: msg.timestamp)
-            self.messages = [dup[0] for dup in groupby(self.messages)]
-            messages = self.messages
+            added_messages = self.messages.add(new_messages)
+            if self.dump_chat:
+                self._dump_pending.extend(added_messages)
 
         with self.group_lock:
-            for group_list in self.group_lists:
-                group_list.update(messages)
+            prev_version = self._version
+            self._dispatch(added_messages)
+            if self._version != prev_version:
+                self._publish()
 
-    def save(self):
-        """Save report to archives directory and finalize"""
+    def _dispatch(self, messages: Iterable[Message]):
+        """Add messages in timestamp order to the group lists whose groupers they match"""
+        prev_versions = sum(gl.version for gl in self.group_lists)
+
+        for message in messages:
+            for i in self.matcher.match(message):
+                self.group_lists[i].add_match(message)
+
+        if sum(gl.version for gl in self.group_lists) != prev_versions:
+            self._version += 1
+
+    def _publish(self):
+        """Send changes since the last publish to the IOLoop's copy (hold group_lock)
+
+        The delta is built on the calling thread, so the IOLoop only has to splice it in and
+        never waits for grouping to finish. The copy encodes the full report only when asked.
+        """
+        change_id = next_change_id()
+        delta = self._delta(self._published_change_id)
+        self._published_change_id = change_id
+
+        if delta is None:
+            return
+
+        self._ioloop.add_callback(self._apply, delta)
+
+    def _apply(self, delta: dict):
+        self._view.apply(delta)
+        if self.on_change is not None:
+            self.on_change()
+
+    @property
+    def version(self) -> int:
+        """Version of the report served on the IOLoop, which increases with every change"""
+        return self._view.version
+
+    @property
+    def basename(self) -> str:
+        """Base file name for this report's files in the archives directory"""
         report_datetime = datetime.fromtimestamp(self.info.start_timestamp).isoformat(
             timespec="seconds"
         )
-        report_basename = f"{report_datetime}_{self.info.id}".replace(":", "")
-        report_path = (
-            tornado.options.options.archives_dir / f"{report_basename}.json.gz"
-        )
+        return f"{report_datetime}_{self.info.id}".replace(":", "")
+
+    def flush_chat(self):
+        """Append messages added since the last flush to the chat dump, if dumping is enabled
+
+        The dump is gzipped JSON Lines with one gzip member per flush, so it can be written
+        incrementally during the stream and appended to after a restart. Safe to call from any
+        thread.
+        """
+        if not self.dump_chat:
+            return
+
+        with self._dump_lock:
+            with self.message_lock:
+                pending = self._dump_pending
+                self._dump_pending = []
+
+            if len(pending) == 0:
+                return
 
-        if tornado.options.options.dump_chat and self.info.channel.org in SAVE_ORGS:
-            messages_json = [msg.json() for msg in self.messages]
             messages_path = (
-                tornado.options.options.archives_dir / f"{report_basename}_chat.json.gz"
+                tornado.options.options.archives_dir / f"{self.basename}_chat.jsonl.gz"
             )
+            append_messages(messages_path, pending)
 
-            if messages_path.exists():
-                with gzip.open(messages_path, "rt") as existing_file:
-                    existing_messages = json.load(existing_file)
-                messages_json = existing_messages + messages_json
+    def save(self):
+        """Save report to archives directory and finalize"""
+        report_path = tornado.options.options.archives_dir / f"{self.basename}.json.gz"
 
-            with gzip.open(messages_path, "wt") as dump_file:
-                json.dump(messages_json, dump_file)
+        self.flush_chat()
 
-        if len(self) == 0:
-            return
+        with self.message_lock:
+            self.messages.close()
 
         report_json = self.json()
 
+        # Lists without groups are left out, so this report has no groups
+        if len(report_json["group_lists"]) == 0:
+            return
+
         if report_path.exists():
-            with gzip.oepn(report_path, "rt") as existing_file:
+            with gzip.open(report_path, "rt") as existing_file:
                 existing_report = json.load(existing_file)
             report_json = combine_reports(existing_report, report_json)
 
+        # Positions in grouper order only matter to live clients, and would collide once
+        # reports are combined (including reports archived with them before)
+        for group_list in report_json["group_lists"]:
+            group_list.pop("index", None)
+
         with gzip.open(report_path, "wt") as report_file:
             json.dump(report_json, report_file)
 
+        get_archive_index().add(report_path, report_json)
+
     def json(self) -> dict:
         """Return a JSON representation of this report"""
         with self.group_lock:
-            ret = {
-                "id": self.info.id,
-                "url": self.info.url,
-                "title": self.info.title,
-                "channel_url": self.info.channel.url,
-                "channel_name": self.info.channel.name,
-                "thumbnail_url": self.info.channel.thumbnail_url,
-                "group_lists": [
-                    {
-                        "description": group_list.description,
-                        "notify": group_list.notify,
-                        "groups": [
-                            [
-                                {
-                                    "author": message.author,
-                                    "text": message.text,
-                                    "timestamp": message.timestamp,
-                                    "relative_timestamp": message.relative_timestamp,
-                                }
-                                for message in group
-                            ]
-                            for group in group_list.groups
-                        ],
-                    }
-                    for group_list in filter(lambda gl: len(gl) > 0, self.group_lists)
-                ],
-            }
-
-        return ret
+            return self._json()
+
+    def json_bytes(self) -> bytes:
+        """Return the encoded JSON representation of this report as last published
+
+        Called on the IOLoop; never waits for groups being computed on another thread.
+        """
+        return self._view.json_bytes()
+
+    def _json(self) -> dict:
+        return {
+            "id": self.info.id,
+            "url": self.info.url,
+            "title": self.info.title,
+            "channel_url": self.info.channel.url,
+            "channel_name": self.info.channel.name,
+            "thumbnail_url": self.info.channel.thumbnail_url,
+            "group_lists": [
+                {
+                    "description": group_list.description,
+                    "notify": group_list.notify,
+                    "index": index,
+                    "groups": list(map(_group_json, group_list.groups)),
+                }
+                for index, group_list in enumerate(self.group_lists)
+                if len(group_list) > 0
+            ],
+        }
+
+    def delta(self, since: int) -> Optional[dict]:
+        """Return a JSON representation of changes to this report after the given change ID
+
+        Each changed group list holds its groups from index "start" onward, which replace the
+        groups from that index in the previous state, and its position "index" in grouper order.
+        Reports created or regrouped after the change ID are returned in full and marked as such.
+        Returns None if nothing changed.
+
+        Called on the IOLoop, and answered from the last published state, with change IDs
+        assigned when it was published.
+        """
+        return self._view.delta(since)
+
+    def _delta(self, since: int) -> Optional[dict]:
+        """delta, computed from the current groups and their own change IDs (hold group_lock)"""
+        if self.reset_change_id > since:
+            ret = self._json()
+            ret["full"] = True
+            return ret
+
+        group_lists = []
+
+        for index, group_list in enumerate(self.group_lists):
+            start = group_list.changed_since(since)
+            if start is None:
+                continue
+            group_lists.append(
+                {
+                    "description": group_list.description,
+                    "notify": group_list.notify,
+                    "index": index,
+                    "start": start,
+                    "groups": list(map(_group_json, group_list.groups[start:])),
+                }
+            )
+
+        if len(group_lists) == 0:
+            return None
+
+        return {"id": self.info.id, "full": False, "group_lists": group_lists}
 
     def __len__(self):
-        """The total number of groups in this report, across all lists"""
-        with self.group_lock:
-            return sum(map(len, self.group_lists))
+        """The total number of groups in this report as last published, across all lists"""
+        return len(self._view)
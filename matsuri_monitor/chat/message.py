@@ -5,6 +5,9 @@ import tornado.web
 
 @dataclass
 class Message:
+    # Reports keep every message of a stream, so avoid a per-instance __dict__
+    __slots__ = ("author", "text", "timestamp", "relative_timestamp")
+
     author: str
     text: str
     timestamp: float
@@ -21,9 +24,20 @@ class Message:
 
         return d
 
+    @staticmethod
+    def from_json(d: dict) -> "Message":
+        """Create a Message or SuperChat from its JSON representation"""
+        d = dict(d)
+        message_type = d.pop("type", "message")
+        if message_type == "superchat":
+            return SuperChat(**d)
+        return Message(**d)
+
 
 @dataclass
 class SuperChat(Message):
+    __slots__ = ("amount",)
+
     amount: str
 
     @property
@@ -0,0 +1,110 @@
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+
+from matsuri_monitor.chat.chat_file import append_messages, read_messages
+from matsuri_monitor.chat.message import Message
+
+RECENT_INDEX_SIZE = 10_000
+SPILL_CHUNK_SIZE = 1_000
+
+
+def _message_key(message: Message) -> tuple:
+    """Hashable key identifying a message for deduplication"""
+    return (type(message), message.timestamp, message.author, message.text)
+
+
+class MessageStore:
+    def __init__(
+        self, index_size: int = RECENT_INDEX_SIZE, spill_path: Optional[Path] = None
+    ):
+        """Append-optimized store of chat messages, kept in timestamp order
+
+        Parameters
+        ----------
+        index_size
+            Number of recently added messages remembered for deduplication
+        spill_path
+            If given, messages older than the retention window are moved out of memory and
+            appended to this file, from which they are streamed back when iterating
+        """
+        self.index_size = index_size
+        self.spill_path = spill_path
+        self.window: Optional[float] = None
+        self._messages: List[Message] = []
+        self._timestamps: List[float] = []
+        self._recent = OrderedDict()
+        self._spilled_count = 0
+
+        if spill_path is not None and spill_path.exists():
+            spill_path.unlink()
+
+    def add(self, new_messages: Iterable[Message]) -> List[Message]:
+        """Merge a batch of messages into the store
+
+        Batches are expected to be nearly sorted and mostly newer than the stored messages, so
+        most messages are appended to the tail and late ones are inserted with a binary search.
+
+        Returns
+        -------
+        List[Message]
+            The messages that were not already in the store, in timestamp order
+        """
+        added = []
+
+        for message in sorted(new_messages, key=lambda msg: msg.timestamp):
+            key = _message_key(message)
+            if key in self._recent:
+                continue
+
+            self._recent[key] = None
+            if len(self._recent) > self.index_size:
+                self._recent.popitem(last=False)
+
+            timestamp = message.timestamp
+            if len(self._timestamps) == 0 or timestamp >= self._timestamps[-1]:
+                self._messages.append(message)
+                self._timestamps.append(timestamp)
+            else:
+                i = bisect_right(self._timestamps, timestamp)
+                self._messages.insert(i, message)
+                self._timestamps.insert(i, timestamp)
+
+            added.append(message)
+
+        if self.spill_path is not None and self.window is not None:
+            self.spill()
+
+        return added
+
+    def spill(self):
+        """Move messages older than the retention window from memory to the spill file
+
+        Messages are spilled in chunks to keep file appends infrequent. Messages that arrive
+        later than the window are spilled after newer ones, so the file is only nearly sorted.
+        """
+        if len(self._timestamps) == 0:
+            return
+
+        cutoff = bisect_left(self._timestamps, self._timestamps[-1] - self.window)
+        if cutoff < SPILL_CHUNK_SIZE:
+            return
+
+        append_messages(self.spill_path, self._messages[:cutoff])
+        del self._messages[:cutoff]
+        del self._timestamps[:cutoff]
+        self._spilled_count += cutoff
+
+    def close(self):
+        """Delete the spill file, if any (the store is unusable afterward)"""
+        if self.spill_path is not None and self.spill_path.exists():
+            self.spill_path.unlink()
+
+    def __iter__(self) -> Iterator[Message]:
+        if self._spilled_count > 0:
+            yield from read_messages(self.spill_path)
+        yield from self._messages
+
+    def __len__(self):
+        return self._spilled_count + len(self._messages)
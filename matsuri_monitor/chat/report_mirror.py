@@ -0,0 +1,128 @@
+from bisect import bisect_right
+from typing import Callable, Dict, Optional
+
+import tornado.escape
+
+from matsuri_monitor.chat.group_list import ChangeLog, next_change_id
+from matsuri_monitor.chat.info import VideoInfo
+
+
+class ReportMirror:
+    def __init__(self, info: VideoInfo):
+        """Copy of a LiveReport updated from the report's deltas
+
+        Serves the same JSON, versions and deltas as the report it mirrors, with change IDs
+        assigned as deltas are applied. LiveReport keeps one to serve the IOLoop while groups are
+        computed on other threads, and the Supervisor keeps one per report in a worker process.
+
+        Parameters
+        ----------
+        info
+            VideoInfo of the mirrored report
+        """
+        self.info = info
+        self.version = 0
+        self.reset_change_id = next_change_id()
+        self.on_change: Optional[Callable[[], None]] = None
+        self._report = {
+            "id": info.id,
+            "url": info.url,
+            "title": info.title,
+            "channel_url": info.channel.url,
+            "channel_name": info.channel.name,
+            "thumbnail_url": info.channel.thumbnail_url,
+            "group_lists": [],
+        }
+        self._changes: Dict[str, ChangeLog] = {}
+        self._json_bytes = None
+        self._json_bytes_version = None
+
+    def apply(self, delta: dict):
+        """Apply a delta returned by the mirrored report's LiveReport.delta"""
+        if delta["full"]:
+            self._report = {key: value for key, value in delta.items() if key != "full"}
+            self._changes = {
+                group_list["description"]: ChangeLog()
+                for group_list in self._report["group_lists"]
+            }
+            self.reset_change_id = next_change_id()
+        else:
+            group_lists = {
+                group_list["description"]: group_list
+                for group_list in self._report["group_lists"]
+            }
+
+            for changed in delta["group_lists"]:
+                description = changed["description"]
+                if description not in group_lists:
+                    group_lists[description] = {
+                        "description": description,
+                        "notify": changed["notify"],
+                        "index": changed["index"],
+                        "groups": [],
+                    }
+                    self._insert(group_lists[description])
+                    self._changes[description] = ChangeLog()
+
+                groups = group_lists[description]["groups"]
+                del groups[changed["start"] :]
+                groups.extend(changed["groups"])
+                self._changes[description].log(changed["start"])
+
+        self.version += 1
+
+        if self.on_change is not None:
+            self.on_change()
+
+    def _insert(self, group_list: dict):
+        """Insert a new group list at its position in grouper order"""
+        indices = [other["index"] for other in self._report["group_lists"]]
+        position = bisect_right(indices, group_list["index"])
+        self._report["group_lists"].insert(position, group_list)
+
+    def json(self) -> dict:
+        """Return a JSON representation of the mirrored report"""
+        ret = dict(self._report)
+        ret["group_lists"] = [gl for gl in ret["group_lists"] if len(gl["groups"]) > 0]
+        return ret
+
+    def json_bytes(self) -> bytes:
+        """Return the encoded JSON representation, cached until the next delta"""
+        if self._json_bytes_version != self.version:
+            self._json_bytes = tornado.escape.utf8(
+                tornado.escape.json_encode(self.json())
+            )
+            self._json_bytes_version = self.version
+        return self._json_bytes
+
+    def delta(self, since: int) -> Optional[dict]:
+        """Return changes after the given change ID, in the same form as LiveReport.delta"""
+        if self.reset_change_id > since:
+            ret = self.json()
+            ret["full"] = True
+            return ret
+
+        group_lists = []
+
+        for group_list in self._report["group_lists"]:
+            start = self._changes[group_list["description"]].changed_since(since)
+            if start is None:
+                continue
+            group_lists.append(
+                {
+                    "description": group_list["description"],
+                    "notify": group_list["notify"],
+                    "index": group_list["index"],
+                    "start": start,
+                    "groups": group_list["groups"][start:],
+                }
+            )
+
+        if len(group_lists) == 0:
+            return None
+
+        return {"id": self.info.id, "full": False, "group_lists": group_lists}
+
+    def __len__(self):
+        """The total number of groups in the mirrored report, across all lists"""
+        return sum(len(gl["groups"]) for gl in self._report["group_lists"])
@@ -1,2 +1,5 @@
 from matsuri_monitor.clients.holodex import HoloDex
 from matsuri_monitor.clients.monitor import Monitor
+from matsuri_monitor.clients.pipeline import ChatPipeline, pipeline_stats
+from matsuri_monitor.clients.scheduler import RequestScheduler
+from matsuri_monitor.clients.session_pool import SessionPool
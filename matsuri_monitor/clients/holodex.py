@@ -1,123 +1,176 @@
+import asyncio
+import http
 import multiprocessing as mp
 import os
+from dataclasses import dataclass
 from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
 
 import aiohttp
-import pandas as pd
 
-from matsuri_monitor import chat, util
+from matsuri_monitor import chat
+from matsuri_monitor.clients.session_pool import SessionPool
 
 CHANNEL_ENDPOINT = "https://holodex.net/api/v2/channels"
 LIVE_ENDPOINT = "https://holodex.net/api/v2/live"
 WATCHED_ORGS = ["Hololive", "Nijisanji", "VSpo", "774inc", "Neo-Porte"]
 HOLODEX_API_KEY = os.getenv("HOLODEX_API_KEY")
 HEADERS = {"X-APIKEY": HOLODEX_API_KEY}
+PAGE_SIZE = 50
+MAX_CONCURRENT_REQUESTS = 4
+
+
+@dataclass
+class ChannelRecord:
+    """Fields of a Holodex channel used by the monitor"""
+
+    __slots__ = ("name", "photo", "org")
+
+    name: str
+    photo: str
+    org: str
+
+
+@dataclass
+class LiveRecord:
+    """Fields of a Holodex live stream used by the monitor"""
+
+    __slots__ = ("title", "live_start", "channel")
+
+    title: str
+    live_start: str
+    channel: str
 
 
 class HoloDex:
-    def __init__(self):
+    def __init__(self, sessions: SessionPool):
+        self.sessions = sessions
         self._lock = mp.Lock()
-        self.lives = pd.DataFrame(
-            index=pd.Series(name="id"), columns=["title", "start", "channel"]
+        self._request_slots = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        # Validators and content of each page fetched, to revalidate instead of refetching
+        self._pages: Dict[tuple, Tuple[Optional[str], Optional[str], list]] = {}
+        self.channels: Dict[str, ChannelRecord] = None
+        self.lives: Dict[str, LiveRecord] = {}
+
+    async def get_page(
+        self, session: aiohttp.ClientSession, endpoint: str, params: dict
+    ) -> list:
+        """Fetch one page of results, revalidating a previously fetched copy if there is one"""
+        key = (endpoint, tuple(sorted(params.items())))
+        headers = dict(HEADERS)
+
+        cached = self._pages.get(key)
+        if cached is not None:
+            etag, last_modified, _ = cached
+            if etag is not None:
+                headers["If-None-Match"] = etag
+            if last_modified is not None:
+                headers["If-Modified-Since"] = last_modified
+
+        async with self._request_slots:
+            async with session.get(endpoint, params=params, headers=headers) as resp:
+                if resp.status == http.HTTPStatus.NOT_MODIFIED and cached is not None:
+                    return cached[2]
+                page = await resp.json(content_type=None)
+                etag = resp.headers.get("ETag")
+                last_modified = resp.headers.get("Last-Modified")
+
+        if etag is not None or last_modified is not None:
+            self._pages[key] = (etag, last_modified, page)
+
+        return page
+
+    async def get_all(
+        self, session: aiohttp.ClientSession, endpoint: str, params: dict, org: str
+    ) -> list:
+        """Fetch all pages of results for an org"""
+        results = []
+        offset = 0
+
+        while True:
+            page_params = dict(params, offset=offset, limit=PAGE_SIZE, org=org)
+            page = await self.get_page(session, endpoint, page_params)
+            if not page:
+                break
+
+            results += page
+
+            # A short page is the last one, so it saves a request for an empty page
+            if len(page) < PAGE_SIZE:
+                break
+            offset += PAGE_SIZE
+
+        return results
+
+    async def get_all_orgs(
+        self, session: aiohttp.ClientSession, endpoint: str, params: dict
+    ) -> Dict[str, list]:
+        """Fetch all pages of results for each watched org, with orgs fetched concurrently"""
+        results = await asyncio.gather(
+            *[self.get_all(session, endpoint, params, org) for org in WATCHED_ORGS]
         )
+        return dict(zip(WATCHED_ORGS, results))
 
     async def retrieve_channels(self, session: aiohttp.ClientSession):
-        channels = []
-
-        for org in WATCHED_ORGS:
-            offset = 0
-            while True:
-                params = {"offset": offset, "limit": 50, "type": "vtuber", "org": org}
-                async with session.get(
-                    CHANNEL_ENDPOINT, params=params, headers=HEADERS
-                ) as resp:
-                    new_channels = await resp.json(content_type=None)
+        channels = {}
 
-                if not new_channels:
-                    break
-
-                for channel in new_channels:
-                    channel["org"] = org
+        org_channels = await self.get_all_orgs(
+            session, CHANNEL_ENDPOINT, {"type": "vtuber"}
+        )
 
-                channels += new_channels
-                offset += 50
+        for org, new_channels in org_channels.items():
+            for channel in new_channels:
+                channels.setdefault(
+                    channel["id"], ChannelRecord(channel["name"], channel["photo"], org)
+                )
 
-        self.channels = pd.DataFrame.from_records(channels, index="id")
+        self.channels = channels
 
-    @util.http_session_method
-    async def update(self, session: aiohttp.ClientSession):
+    async def update(self):
         """Re-accesses holodex endpoints and updates active lives"""
-        if not hasattr(self, "channels"):
+        session = self.sessions.get()
+
+        if self.channels is None:
             await self.retrieve_channels(session)
 
-        lives = []
-        for org in WATCHED_ORGS:
-            offset = 0
-            while True:
-                params = {"offset": offset, "limit": 50, "status": "live", "org": org}
-                async with session.get(
-                    LIVE_ENDPOINT, params=params, headers=HEADERS
-                ) as resp:
-                    new_lives = await resp.json(content_type=None)
-
-                if not new_lives:
-                    break
-
-                lives += new_lives
-                offset += 50
-
-        include_cols = ["id", "title", "live_start", "channel"]
-
-        lives_records = [
-            {
-                "id": lv["id"],
-                "title": lv["title"],
-                "live_start": lv["start_actual"],
-                "channel": lv["channel"]["id"],
-            }
-            for lv in lives
-            if "start_actual" in lv
-        ]
-
-        if len(lives_records) > 0:
-            lives_df = pd.DataFrame.from_records(
-                lives_records,
-                index="id",
-                columns=include_cols,
-            )
-            lives_df = lives_df[~lives_df.index.duplicated(keep="first")]
-        else:
-            lives_df = pd.DataFrame(
-                index=pd.Series(name="id", dtype=str),
-                columns=include_cols[1:],
-            )
+        org_lives = await self.get_all_orgs(session, LIVE_ENDPOINT, {"status": "live"})
+        lives = [lv for new_lives in org_lives.values() for lv in new_lives]
+
+        lives_records = {}
+
+        for lv in lives:
+            if "start_actual" in lv:
+                lives_records.setdefault(
+                    lv["id"],
+                    LiveRecord(lv["title"], lv["start_actual"], lv["channel"]["id"]),
+                )
 
         with self._lock:
-            self.lives = lives_df
+            self.lives = lives_records
 
     @property
     def currently_live(self):
         """Returns IDs of currently live streams"""
-        return self.lives.index.tolist()
+        return list(self.lives)
 
     def get_channel_info(self, channel_id: str):
         """Returns a ChannelInfo object for the given channel ID"""
-        channel_row = self.channels.loc[channel_id]
+        channel = self.channels[channel_id]
         return chat.ChannelInfo(
             id=channel_id,
-            name=channel_row["name"],
-            thumbnail_url=channel_row["photo"],
-            org=channel_row["org"],
+            name=channel.name,
+            thumbnail_url=channel.photo,
+            org=channel.org,
         )
 
     def get_live_info(self, video_id: str):
         """Returns a VideoInfo object for the given video ID"""
-        row = self.lives.loc[video_id]
+        live = self.lives[video_id]
         return chat.VideoInfo(
             id=video_id,
-            title=row["title"],
-            channel=self.get_channel_info(row["channel"]),
-            start_timestamp=datetime.fromisoformat(row["live_start"].rstrip("zZ"))
+            title=live.title,
+            channel=self.get_channel_info(live.channel),
+            start_timestamp=datetime.fromisoformat(live.live_start.rstrip("zZ"))
             .replace(tzinfo=timezone.utc)
             .timestamp(),
         )
@@ -0,0 +1,123 @@
+import codecs
+import json
+import re
+from typing import Any, Dict, Optional, Tuple
+
+from bs4 import BeautifulSoup
+
+YTCFG_RE = re.compile(r"^\s*ytcfg.set\((.+)\);?", re.MULTILINE)
+YTCFG_ARGS_RE = re.compile(r'^"([A-Z_]+)", (.+)$')
+
+# Each value starts right after its marker and ends before the closing tag of its script
+INITIAL_DATA_RE = re.compile(r'ytInitialData"?\]?\s*=\s*')
+API_KEY_RE = re.compile(r'"INNERTUBE_API_KEY"\s*[:,]\s*')
+CONTEXT_RE = re.compile(r'"INNERTUBE_CONTEXT"\s*[:,]\s*')
+SCRIPT_END = "</script>"
+WHITESPACE_RE = re.compile(r"\s*")
+
+# Markers are searched again from slightly before the end of the previous search, in case a
+# marker spans two chunks
+SEARCH_OVERLAP = 64
+
+InitialChat = Tuple[Optional[Dict[str, Any]], Optional[str], Optional[Dict[str, Any]]]
+
+
+class InitialChatExtractor:
+    def __init__(self):
+        """Incrementally scans a live_chat page for the initial chat object and ytcfg values
+
+        Feed the response body chunk by chunk; feeding reports when all values have been found,
+        so the rest of the page need not be read. No DOM is built: each value is located by its
+        marker and decoded as JSON in place once its script has been fully received.
+        """
+        self.text = ""
+        self.chat_obj: Optional[Dict[str, Any]] = None
+        self.key: Optional[str] = None
+        self.context: Optional[Dict[str, Any]] = None
+        self._utf8 = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._json = json.JSONDecoder()
+        self._search_from = {"chat_obj": 0, "key": 0, "context": 0}
+        self._value_starts: Dict[str, int] = {}
+
+    @property
+    def done(self) -> bool:
+        """Whether all values have been found"""
+        return (
+            self.chat_obj is not None
+            and self.key is not None
+            and self.context is not None
+        )
+
+    def feed(self, chunk: bytes, final: bool = False) -> bool:
+        """Scan the next chunk of the page and return whether all values have been found"""
+        self.text += self._utf8.decode(chunk, final)
+
+        if self.chat_obj is None:
+            self.chat_obj = self._extract("chat_obj", INITIAL_DATA_RE)
+        if self.key is None:
+            self.key = self._extract("key", API_KEY_RE)
+        if self.context is None:
+            self.context = self._extract("context", CONTEXT_RE)
+
+        return self.done
+
+    def _extract(self, name: str, marker_re: re.Pattern):
+        """Decode the value after the given marker once it is complete, or return None"""
+        if name not in self._value_starts:
+            match = marker_re.search(self.text, self._search_from[name])
+            if match is None:
+                self._search_from[name] = max(len(self.text) - SEARCH_OVERLAP, 0)
+                return None
+            self._value_starts[name] = match.end()
+
+        # Whitespace after the marker may not have been received when the marker was found
+        start = WHITESPACE_RE.match(self.text, self._value_starts[name]).end()
+
+        # Decoding is only attempted once the value's script is complete, to avoid repeatedly
+        # scanning a large, partially received object
+        if self.text.find(SCRIPT_END, start) < 0:
+            return None
+
+        try:
+            value, _ = self._json.raw_decode(self.text, start)
+        except json.JSONDecodeError:
+            value = None
+
+        if value is None:
+            # Not a usable value after all (including null); look for the next occurrence of
+            # the marker rather than decoding this one again on every feed
+            del self._value_starts[name]
+            self._search_from[name] = start
+            return self._extract(name, marker_re)
+
+        return value
+
+
+def parse_initial_chat_html(html: str) -> InitialChat:
+    """Find the initial chat object and ytcfg values by parsing the full live_chat page"""
+    soup = BeautifulSoup(html, features="lxml")
+
+    chat_obj, key, context = None, None, None
+
+    for script in soup.find_all("script"):
+        if "ytInitialData" in script.text:
+            initial_data_str = script.text.split("=", 1)[-1].strip().strip(";")
+            chat_obj = json.loads(initial_data_str)
+            continue
+
+        for args in YTCFG_RE.findall(script.text):
+            if args.startswith("{"):
+                args_obj = json.loads(args)
+                if "INNERTUBE_API_KEY" in args_obj:
+                    key = args_obj["INNERTUBE_API_KEY"]
+                if "INNERTUBE_CONTEXT" in args:
+                    context = args_obj["INNERTUBE_CONTEXT"]
+
+            match = YTCFG_ARGS_RE.search(args)
+            if match:
+                if match.group(1) == "INNERTUBE_API_KEY":
+                    key = match.group(2)
+                if match.group(1) == "INNERTUBE_CONTEXT":
+                    context = json.loads(match.group(2))
+
+    return chat_obj, key, context
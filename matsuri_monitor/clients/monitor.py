@@ -2,8 +2,9 @@ import asyncio
 import dataclasses
 import json
 import logging
-import re
-from typing import Any, Dict
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
 from urllib.parse import parse_qs, urlparse
 
 import aiohttp
@@ -11,9 +12,19 @@ import tornado.gen
 import tornado.ioloop
 import tornado.options
 from aiohttp.client_exceptions import ContentTypeError
-from bs4 import BeautifulSoup
 
-from matsuri_monitor import chat, util
+from matsuri_monitor import chat
+from matsuri_monitor.clients.initial_chat import (
+    InitialChatExtractor,
+    parse_initial_chat_html,
+)
+from matsuri_monitor.clients.pipeline import ChatPipeline
+from matsuri_monitor.clients.scheduler import (
+    DEFAULT_PRIORITY,
+    NOTIFY_PRIORITY,
+    RequestScheduler,
+)
+from matsuri_monitor.clients.session_pool import SessionPool
 
 logger = logging.getLogger("tornado.general")
 
@@ -26,9 +37,6 @@ REQUEST_HEADERS = {
     "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/80.0.3987.149 Safari/537.36",
 }
 
-YTCFG_RE = re.compile(r"^\s*ytcfg.set\((.+)\);?", re.MULTILINE)
-YTCFG_ARGS_RE = re.compile(r'^"([A-Z_]+)", (.+)$')
-
 INITIAL_CONTINUATION_PATH = "contents.liveChatRenderer.continuations.0"
 INITIAL_ACTIONS_PATH = "contents.liveChatRenderer.actions"
 
@@ -44,21 +52,14 @@ TIMESTAMP_SUPBATH = "timestampUsec"
 AMOUNT_SUBPATH = "purchaseAmountText.simpleText"
 
 INIT_RETRIES = 5
-UPDATE_INTERVAL = 1
-
-
-def has_path(d, path):
-    """Check if a dot-separated path is in the given nested dict/list"""
-    for k in path.split("."):
-        if k.isdigit():
-            k = int(k)
-            if k >= len(d):
-                return False
-        else:
-            if k not in d:
-                return False
-        d = d[k]
-    return True
+INITIAL_CHAT_CHUNK_SIZE = 64 * 1024
+MIN_UPDATE_INTERVAL = 0.5
+MAX_UPDATE_INTERVAL = 10
+# Polls are spaced so a busy chat returns about this many actions per continuation request
+MESSAGES_PER_UPDATE = 20
+# Weight of the latest poll in the moving average of the message rate
+RATE_SMOOTHING = 0.3
+CHAT_FLUSH_INTERVAL = 60
 
 
 def traverse(d, path):
@@ -78,6 +79,74 @@ def traverse_or_none(d, path):
         return None
 
 
+def compile_path(path: str) -> Tuple[Union[str, int], ...]:
+    """Split a dot-separated path into keys once, for repeated lookups with get_path"""
+    return tuple(int(k) if k.isdigit() else k for k in path.split("."))
+
+
+def get_path(d, keys: Tuple[Union[str, int], ...]):
+    """Return the value at the given compiled path in a nested dict/list, or None if not found"""
+    try:
+        for k in keys:
+            d = d[k]
+    except (KeyError, IndexError, TypeError):
+        return None
+    return d
+
+
+MESSAGE_KEYS = compile_path(MESSAGE_PREFIX)
+SC_KEYS = compile_path(SC_PREFIX)
+AUTHOR_KEYS = compile_path(AUTHOR_SUBPATH)
+TEXT_RUNS_KEYS = compile_path(TEXT_RUNS_SUBPATH)
+TIMESTAMP_KEYS = compile_path(TIMESTAMP_SUPBATH)
+AMOUNT_KEYS = compile_path(AMOUNT_SUBPATH)
+
+
+def continuation_timeout(continuation_obj: dict) -> Optional[float]:
+    """Seconds YouTube suggests waiting before requesting the given continuation, if given"""
+    for data in continuation_obj.values():
+        if "continuation" in data and "timeoutMs" in data:
+            return data["timeoutMs"] / 1000
+    return None
+
+
+class UpdateInterval:
+    def __init__(self):
+        """Adaptive wait between continuation requests for one chat
+
+        Follows YouTube's timeoutMs hint, which grows on quiet chats, but polls sooner when the
+        observed message rate would otherwise fill continuations faster than the hint allows.
+        """
+        self.rate: Optional[float] = None
+        self._last_update = time.monotonic()
+
+    def observe(self, num_actions: int):
+        """Record the number of chat actions returned by the latest poll"""
+        now = time.monotonic()
+        elapsed = max(now - self._last_update, MIN_UPDATE_INTERVAL)
+        self._last_update = now
+
+        rate = num_actions / elapsed
+        if self.rate is None:
+            self.rate = rate
+        else:
+            self.rate = RATE_SMOOTHING * rate + (1 - RATE_SMOOTHING) * self.rate
+
+    def next(self, continuation_obj: dict) -> float:
+        """Seconds to wait before requesting the given continuation"""
+        interval = continuation_timeout(continuation_obj)
+
+        if self.rate:
+            rate_interval = MESSAGES_PER_UPDATE / self.rate
+            interval = (
+                rate_interval if interval is None else min(interval, rate_interval)
+            )
+        elif interval is None:
+            interval = MAX_UPDATE_INTERVAL
+
+        return min(max(interval, MIN_UPDATE_INTERVAL), MAX_UPDATE_INTERVAL)
+
+
 class RestartMonitor(Exception):
     pass
 
@@ -95,7 +164,13 @@ class ChatState:
 
 
 class Monitor:
-    def __init__(self, info: chat.VideoInfo, report: chat.LiveReport):
+    def __init__(
+        self,
+        info: chat.VideoInfo,
+        report: chat.LiveReport,
+        sessions: SessionPool,
+        scheduler: RequestScheduler,
+    ):
         """init
 
         Parameters
@@ -104,9 +179,16 @@ class Monitor:
             VideoInfo for the video to monitor
         report
             LiveReport to write chat messages to
+        sessions
+            Shared pool of HTTP connections
+        scheduler
+            Shared scheduler that paces chat requests across monitors
         """
         self.info = info
         self.report = report
+        self.sessions = sessions
+        self.scheduler = scheduler
+        self.pipeline = ChatPipeline(self.parse_actions, report)
         self._terminate_flag = asyncio.Event()
         self._stopped_flag = asyncio.Event()
 
@@ -114,43 +196,46 @@ class Monitor:
     def is_running(self):
         return not self._stopped_flag.is_set()
 
+    async def wait_stopped(self):
+        """Wait until this monitor stops running"""
+        await self._stopped_flag.wait()
+
+    @property
+    def priority(self) -> int:
+        """Scheduling priority of this monitor's requests, favoring reports that notify"""
+        if any(group_list.notify for group_list in self.report.group_lists):
+            return NOTIFY_PRIORITY
+        return DEFAULT_PRIORITY
+
     async def get_initial_chat(
         self, session: aiohttp.ClientSession, video_id: str
     ) -> dict:
         """Get initial chat JSON object from a continuation token"""
 
         endpoint = INITIAL_CHAT_ENDPOINT_TEMPLATE.format(video_id=video_id)
+        extractor = InitialChatExtractor()
+
+        # The ytcfg and initial data scripts come early in the page, so stop reading once found
+        async with self.scheduler.slot(urlparse(endpoint).hostname, self.priority):
+            async with session.get(endpoint, headers=REQUEST_HEADERS) as resp:
+                async for chunk in resp.content.iter_chunked(INITIAL_CHAT_CHUNK_SIZE):
+                    if extractor.feed(chunk):
+                        break
+                else:
+                    extractor.feed(b"", final=True)
 
-        async with session.get(endpoint, headers=REQUEST_HEADERS) as resp:
-            soup = BeautifulSoup(await resp.text(), features="lxml")
-
-        chat_obj, key, context = None, None, None
-
-        for script in soup.find_all("script"):
-            if "ytInitialData" in script.text:
-                initial_data_str = script.text.split("=", 1)[-1].strip().strip(";")
-                chat_obj = json.loads(initial_data_str)
-                continue
+        chat_obj, key, context = extractor.chat_obj, extractor.key, extractor.context
 
-            for args in YTCFG_RE.findall(script.text):
-                if args.startswith("{"):
-                    args_obj = json.loads(args)
-                    if "INNERTUBE_API_KEY" in args_obj:
-                        key = args_obj["INNERTUBE_API_KEY"]
-                    if "INNERTUBE_CONTEXT" in args:
-                        context = args_obj["INNERTUBE_CONTEXT"]
-
-                match = YTCFG_ARGS_RE.search(args)
-                if match:
-                    if match.group(1) == "INNERTUBE_API_KEY":
-                        key = match.group(2)
-                    if match.group(1) == "INNERTUBE_CONTEXT":
-                        context = json.loads(match.group(2))
+        if chat_obj is None or key is None or context is None:
+            logger.warning(
+                f"Falling back to parsing the full initial chat page for video_id={video_id}"
+            )
+            chat_obj, key, context = parse_initial_chat_html(extractor.text)
 
         if chat_obj is None:
             raise RuntimeError("Failed to retrieve initial chat object")
 
-        if key is None:
+        if key is None or context is None:
             raise RuntimeError("Failed to retrieve ytcfg object")
 
         return chat_obj, key, context
@@ -182,66 +267,71 @@ class Monitor:
             "continuation": continuation,
         }
 
-        async with session.post(endpoint, json=data, headers=REQUEST_HEADERS) as resp:
-            try:
-                return await resp.json()
-            except ContentTypeError as err:
-                logger.exception(f"{err}: {await resp.text()}")
-                raise err
+        async with self.scheduler.slot(urlparse(endpoint).hostname, self.priority):
+            async with session.post(
+                endpoint, json=data, headers=REQUEST_HEADERS
+            ) as resp:
+                try:
+                    return await resp.json()
+                except ContentTypeError as err:
+                    logger.exception(f"{err}: {await resp.text()}")
+                    raise err
 
     def parse_action(self, action: dict) -> chat.Message:
         start_timestamp = self.info.start_timestamp
 
-        if has_path(action, MESSAGE_PREFIX):
-            message_obj = traverse(action, MESSAGE_PREFIX)
-
-            if all(
-                has_path(message_obj, pth)
-                for pth in [AUTHOR_SUBPATH, TEXT_RUNS_SUBPATH, TIMESTAMP_SUPBATH]
-            ):
-                author = traverse(message_obj, AUTHOR_SUBPATH)
-                text = "".join(
-                    run.get("text", "")
-                    for run in traverse(message_obj, TEXT_RUNS_SUBPATH)
-                )
-                timestamp = float(traverse(message_obj, TIMESTAMP_SUPBATH)) / 1_000_000
+        message_obj = get_path(action, MESSAGE_KEYS)
+        is_superchat = False
 
-                return chat.Message(
-                    author=author,
-                    text=text,
-                    timestamp=timestamp,
-                    relative_timestamp=timestamp - start_timestamp,
-                )
+        if message_obj is None:
+            message_obj = get_path(action, SC_KEYS)
+            is_superchat = True
 
-        elif has_path(action, SC_PREFIX):
-            message_obj = traverse(action, SC_PREFIX)
-
-            if all(
-                has_path(message_obj, pth)
-                for pth in [
-                    AUTHOR_SUBPATH,
-                    TEXT_RUNS_SUBPATH,
-                    TIMESTAMP_SUPBATH,
-                    AMOUNT_SUBPATH,
-                ]
-            ):
-                author = traverse(message_obj, AUTHOR_SUBPATH)
-                text = "".join(
-                    run.get("text", "")
-                    for run in traverse(message_obj, TEXT_RUNS_SUBPATH)
-                )
-                timestamp = float(traverse(message_obj, TIMESTAMP_SUPBATH)) / 1_000_000
-                amount = traverse(message_obj, AMOUNT_SUBPATH)
-
-                return chat.SuperChat(
-                    author=author,
-                    text=text,
-                    timestamp=timestamp,
-                    relative_timestamp=timestamp - start_timestamp,
-                    amount=amount,
-                )
+        if message_obj is None:
+            return None
 
-        return None
+        author = get_path(message_obj, AUTHOR_KEYS)
+        runs = get_path(message_obj, TEXT_RUNS_KEYS)
+        timestamp_usec = get_path(message_obj, TIMESTAMP_KEYS)
+
+        if author is None or runs is None or timestamp_usec is None:
+            return None
+
+        author = sys.intern(author)
+        text = "".join(run.get("text", "") for run in runs)
+        timestamp = float(timestamp_usec) / 1_000_000
+
+        if not is_superchat:
+            return chat.Message(
+                author=author,
+                text=text,
+                timestamp=timestamp,
+                relative_timestamp=timestamp - start_timestamp,
+            )
+
+        amount = get_path(message_obj, AMOUNT_KEYS)
+
+        if amount is None:
+            return None
+
+        return chat.SuperChat(
+            author=author,
+            text=text,
+            timestamp=timestamp,
+            relative_timestamp=timestamp - start_timestamp,
+            amount=amount,
+        )
+
+    def parse_actions(self, actions: List[dict]) -> List[chat.Message]:
+        """Parse a batch of chat actions, skipping those that are not chat messages"""
+        messages = []
+
+        for action in actions:
+            message = self.parse_action(action)
+            if message is not None:
+                messages.append(message)
+
+        return messages
 
     async def get_initial_state(self, session: aiohttp.ClientSession):
         for retry in range(INIT_RETRIES):
@@ -295,9 +385,9 @@ class Monitor:
             )
             raise RestartMonitor()
 
-    @util.http_session_method
-    async def _run(self, session: aiohttp.ClientSession):
+    async def _run(self):
         """Monitor process"""
+        session = self.sessions.get()
         termination_signals = 0
         termination_cutoff = 5
 
@@ -306,28 +396,29 @@ class Monitor:
         except AbortMonitor:
             return False
 
-        while True:
-            if actions is not None:
-                try:
-                    new_messages = []
-
-                    for action in actions:
-                        message = self.parse_action(action)
+        last_flush = time.monotonic()
+        update_interval = UpdateInterval()
 
-                        if message is not None:
-                            new_messages.append(message)
+        while True:
+            if self.pipeline.error is not None:
+                error, self.pipeline.error = self.pipeline.error, None
+                logger.error(
+                    f"Error while running monitor for video_id={self.info.id} ({type(error).__name__})",
+                    exc_info=error,
+                )
+                self._stopped_flag.set()
+                return False
 
-                    self.report.add_messages(new_messages)
+            if actions is not None:
+                self.pipeline.submit(actions)
 
-                except Exception as e:
-                    error_name = type(e).__name__
-                    logger.exception(
-                        f"Error while running monitor for video_id={self.info.id} ({error_name})"
-                    )
-                    self._stopped_flag.set()
-                    return False
+            if time.monotonic() - last_flush >= CHAT_FLUSH_INTERVAL:
+                self.pipeline.flush_chat()
+                last_flush = time.monotonic()
 
-            await tornado.gen.sleep(UPDATE_INTERVAL)
+            update_interval.observe(0 if actions is None else len(actions))
+            interval = update_interval.next(state.continuation_obj)
+            await tornado.gen.sleep(self.scheduler.jittered(interval))
 
             actions, state = await self.get_next_state(session, state)
 
@@ -368,6 +459,7 @@ class Monitor:
                     )
 
         await self._terminate_flag.wait()
+        await self.pipeline.drain()
 
         logger.info(f"Serializing report for video_id={self.info.id}")
         self.report.save()
@@ -382,7 +474,7 @@ class Monitor:
             current_ioloop = tornado.ioloop.IOLoop.current()
 
         logger.info(f"Begin monitoring video_id={self.info.id}")
-        current_ioloop.add_callback(self.run)
+        current_ioloop.call_later(self.scheduler.start_delay(), self.run)
 
     def terminate(self):
         """Signal this process to terminate"""
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, List, Optional, Tuple
+
+import tornado.ioloop
+
+from matsuri_monitor import chat
+
+logger = logging.getLogger("tornado.general")
+
+PIPELINE_WORKERS = 4
+# Actions a stream may have waiting for processing before its oldest batches are dropped
+MAX_PENDING_ACTIONS = 5_000
+
+# "publish" is the time from a batch's groups being ready to the IOLoop picking them up
+STAGES = ["queue", "parse", "group", "publish"]
+
+# Chat is parsed and grouped off the IOLoop so a burst on one stream does not delay the
+# polls of other streams or the HTTP handlers
+_pipeline_executor = ThreadPoolExecutor(
+    max_workers=PIPELINE_WORKERS, thread_name_prefix="chat"
+)
+
+
+class PipelineStats:
+    def __init__(self):
+        """Latency of each pipeline stage and counts of coalesced and shed work, for all streams"""
+        self._lock = threading.Lock()
+        self._count = {stage: 0 for stage in STAGES}
+        self._total = {stage: 0.0 for stage in STAGES}
+        self._max = {stage: 0.0 for stage in STAGES}
+        self.batches = 0
+        self.coalesced = 0
+        self.shed_actions = 0
+
+    def record(self, stage: str, seconds: float):
+        """Record the time a batch spent in a stage (safe to call from any thread)"""
+        with self._lock:
+            self._count[stage] += 1
+            self._total[stage] += seconds
+            self._max[stage] = max(self._max[stage], seconds)
+
+    def stats(self) -> dict:
+        """Counters and per-stage latencies in milliseconds"""
+        with self._lock:
+            stages = {
+                stage: {
+                    "count": self._count[stage],
+                    "mean_ms": 1000 * self._total[stage] / max(self._count[stage], 1),
+                    "max_ms": 1000 * self._max[stage],
+                }
+                for stage in STAGES
+            }
+        return {
+            "batches": self.batches,
+            "coalesced": self.coalesced,
+            "shed_actions": self.shed_actions,
+            "stages": stages,
+        }
+
+
+pipeline_stats = PipelineStats()
+
+
+class ChatPipeline:
+    def __init__(
+        self,
+        parse: Callable[[List[dict]], List[chat.Message]],
+        report: chat.LiveReport,
+    ):
+        """Parses and groups one stream's chat actions in a worker thread, one batch at a time
+
+        Batches submitted while one is processing wait and are coalesced into the next batch. If
+        too many actions are waiting, the oldest batches are dropped rather than letting a lagging
+        stream fall further behind. Must be used from the IOLoop.
+
+        Parameters
+        ----------
+        parse
+            Function parsing chat actions into messages (called from a worker thread)
+        report
+            LiveReport to add the messages to (from a worker thread)
+        """
+        self.parse = parse
+        self.report = report
+        self.error: Optional[BaseException] = None
+        self._pending: Deque[Tuple[float, List[dict]]] = deque()
+        self._pending_actions = 0
+        self._processing = False
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def submit(self, actions: List[dict]):
+        """Queue a batch of chat actions for processing"""
+        self._pending.append((time.perf_counter(), actions))
+        self._pending_actions += len(actions)
+
+        while self._pending_actions > MAX_PENDING_ACTIONS and len(self._pending) > 1:
+            _, shed = self._pending.popleft()
+            self._pending_actions -= len(shed)
+            pipeline_stats.shed_actions += len(shed)
+            logger.warning(
+                f"Dropped {len(shed)} chat actions for video_id={self.report.info.id} (lagging)"
+            )
+
+        if not self._processing:
+            self._process_pending()
+
+    def _process_pending(self):
+        batches = list(self._pending)
+        self._pending.clear()
+        self._pending_actions = 0
+        self._processing = True
+        self._idle.clear()
+
+        pipeline_stats.batches += 1
+        pipeline_stats.coalesced += len(batches) - 1
+
+        ioloop = tornado.ioloop.IOLoop.current()
+        future = ioloop.run_in_executor(_pipeline_executor, self._process, batches)
+        ioloop.add_future(future, self._processed)
+
+    def _process(self, batches: List[Tuple[float, List[dict]]]) -> float:
+        started = time.perf_counter()
+        pipeline_stats.record("queue", started - batches[0][0])
+
+        messages = self.parse([action for _, actions in batches for action in actions])
+        parsed = time.perf_counter()
+        pipeline_stats.record("parse", parsed - started)
+
+        self.report.add_messages(messages)
+        grouped = time.perf_counter()
+        pipeline_stats.record("group", grouped - parsed)
+        return grouped
+
+    def _processed(self, future: Future):
+        self._processing = False
+
+        if future.exception() is not None:
+            # The monitor picks up the error on its next poll; waiting batches are dropped
+            self.error = future.exception()
+            self._pending.clear()
+            self._pending_actions = 0
+        else:
+            pipeline_stats.record("publish", time.perf_counter() - future.result())
+
+        if len(self._pending) > 0:
+            self._process_pending()
+        else:
+            self._idle.set()
+
+    def flush_chat(self):
+        """Append new messages to the report's chat dump in a worker thread
+
+        Errors are logged rather than stopping the monitor, since the report itself is unaffected.
+        """
+        ioloop = tornado.ioloop.IOLoop.current()
+        future = ioloop.run_in_executor(_pipeline_executor, self.report.flush_chat)
+        ioloop.add_future(future, self._flushed)
+
+    def _flushed(self, future: Future):
+        error = future.exception()
+        if error is not None:
+            logger.error(
+                f"Error while dumping chat for video_id={self.report.info.id} ({type(error).__name__})",
+                exc_info=error,
+            )
+
+    async def drain(self):
+        """Wait until all submitted batches have been processed"""
+        await self._idle.wait()
@@ -0,0 +1,116 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Tuple
+
+REQUEST_RATE = 20
+REQUEST_BURST = 20
+HOST_CONCURRENCY = 16
+START_JITTER = 5
+POLL_JITTER = 0.1
+
+NOTIFY_PRIORITY = 0
+DEFAULT_PRIORITY = 1
+
+
+class RequestScheduler:
+    def __init__(
+        self,
+        rate: float = REQUEST_RATE,
+        burst: int = REQUEST_BURST,
+        host_concurrency: int = HOST_CONCURRENCY,
+    ):
+        """Global rate limiter for chat requests shared by all monitors
+
+        Requests take a token from a bucket refilled at a steady rate, so polls from many
+        monitors are spread out rather than sent in bursts. Waiting requests are granted tokens in
+        priority order, then wait for one of a limited number of concurrent slots for their host.
+
+        Parameters
+        ----------
+        rate
+            Tokens added to the bucket per second
+        burst
+            Maximum number of tokens in the bucket
+        host_concurrency
+            Maximum number of requests in flight to one host
+        """
+        self.rate = rate
+        self.burst = burst
+        self.host_concurrency = host_concurrency
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+        self._wake_handle: asyncio.TimerHandle = None
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        self.granted = 0
+        self.total_wait = 0.0
+
+    @staticmethod
+    def start_delay() -> float:
+        """Random delay before a monitor's first request, so monitors started together drift apart"""
+        return random.uniform(0, START_JITTER)
+
+    @staticmethod
+    def jittered(interval: float) -> float:
+        """The given poll interval randomly stretched or shrunk by a small fraction"""
+        return interval * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
+
+    @asynccontextmanager
+    async def slot(self, host: str, priority: int = DEFAULT_PRIORITY):
+        """Wait for a token and a slot for the given host, held while the request is made"""
+        requested = time.monotonic()
+        await self._take_token(priority)
+
+        if host not in self._host_slots:
+            self._host_slots[host] = asyncio.Semaphore(self.host_concurrency)
+
+        async with self._host_slots[host]:
+            self.granted += 1
+            self.total_wait += time.monotonic() - requested
+            yield
+
+    async def _take_token(self, priority: int):
+        future = asyncio.get_event_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), future))
+        self._wake()
+        await future
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self._tokens + (now - self._refilled) * self.rate, self.burst
+        )
+        self._refilled = now
+
+    def _wake(self):
+        """Grant available tokens to waiters, and schedule another wake-up if any are left"""
+        if self._wake_handle is not None:
+            self._wake_handle.cancel()
+            self._wake_handle = None
+        self._refill()
+
+        while len(self._waiters) > 0 and self._tokens >= 1:
+            _, _, future = heapq.heappop(self._waiters)
+            # Requests whose monitor was cancelled while waiting do not use a token
+            if future.done():
+                continue
+            future.set_result(None)
+            self._tokens -= 1
+
+        if len(self._waiters) > 0:
+            self._wake_handle = asyncio.get_event_loop().call_later(
+                (1 - self._tokens) / self.rate, self._wake
+            )
+
+    def stats(self) -> dict:
+        """Scheduler counters"""
+        return {
+            "granted": self.granted,
+            "waiting": len(self._waiters),
+            "mean_wait": self.total_wait / self.granted if self.granted > 0 else 0.0,
+        }
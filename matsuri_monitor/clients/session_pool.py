@@ -0,0 +1,63 @@
+import aiohttp
+
+CONNECTION_LIMIT = 100
+CONNECTION_LIMIT_PER_HOST = 50
+DNS_CACHE_TTL = 300
+KEEPALIVE_TIMEOUT = 30
+
+
+class SessionPool:
+    def __init__(self):
+        """Shared aiohttp session whose connector keeps connections alive across requests
+
+        Monitors and the HoloDex client mostly poll the same few hosts, so sharing one connector
+        avoids a new DNS lookup and TLS handshake per request. The session is created on first
+        use, since it must be created while the event loop is running.
+        """
+        self._session: aiohttp.ClientSession = None
+        self.requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+
+    def get(self) -> aiohttp.ClientSession:
+        """Return the shared session, creating it if needed (call from the event loop)"""
+        if self._session is None or self._session.closed:
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_request_start.append(self._on_request_start)
+            trace_config.on_connection_create_end.append(self._on_connection_create)
+            trace_config.on_connection_reuseconn.append(self._on_connection_reuse)
+
+            connector = aiohttp.TCPConnector(
+                limit=CONNECTION_LIMIT,
+                limit_per_host=CONNECTION_LIMIT_PER_HOST,
+                ttl_dns_cache=DNS_CACHE_TTL,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, trace_configs=[trace_config]
+            )
+
+        return self._session
+
+    async def close(self):
+        """Close the shared session and its connections"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _on_request_start(self, session, context, params):
+        self.requests += 1
+
+    async def _on_connection_create(self, session, context, params):
+        self.connections_created += 1
+
+    async def _on_connection_reuse(self, session, context, params):
+        self.connections_reused += 1
+
+    def stats(self) -> dict:
+        """Request and connection counters"""
+        return {
+            "requests": self.requests,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+        }
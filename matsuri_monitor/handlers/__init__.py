@@ -1,3 +1,4 @@
 from matsuri_monitor.handlers.api import APIHandler
-from matsuri_monitor.handlers.archives import ArchivesHandler
+from matsuri_monitor.handlers.archives import ArchivesHandler, archive_cache
+from matsuri_monitor.handlers.live_socket import LiveSocketHandler
 from matsuri_monitor.handlers.main import MainHandler
@@ -1,13 +1,44 @@
-from typing import Callable
+from typing import Callable, Optional, Union
 
 import tornado.web
 
 
 class APIHandler(tornado.web.RequestHandler):
-    def initialize(self, json_source: Callable[[], dict]):
-        """Simple JSON API handler that returns JSON generated by the given callable"""
+    def initialize(
+        self,
+        json_source: Callable[[], Union[dict, bytes]],
+        etag_source: Optional[Callable[[], str]] = None,
+        delta_source: Optional[Callable[[str], bytes]] = None,
+    ):
+        """Simple JSON API handler that returns JSON generated by the given callable
+
+        The callable may return a dict or already-encoded JSON bytes. If an ETag callable is
+        given, requests with a matching If-None-Match are answered with 304 without generating
+        the JSON at all. If a delta callable is given, requests with a "since" argument are
+        answered with its encoded JSON for that cursor instead.
+        """
         self.json_source = json_source
+        self.etag_source = etag_source
+        self.delta_source = delta_source
 
     async def get(self):
         """GET /_monitor/[endpoint].json"""
-        self.write(self.json_source())
+        since = self.get_query_argument("since", None)
+
+        if since is not None and self.delta_source is not None:
+            self.set_header("Content-Type", "application/json; charset=UTF-8")
+            self.write(self.delta_source(since))
+            return
+
+        if self.etag_source is not None:
+            self.set_header("Etag", self.etag_source())
+            if self.check_etag_header():
+                self.set_status(304)
+                return
+
+        body = self.json_source()
+
+        if isinstance(body, bytes):
+            self.set_header("Content-Type", "application/json; charset=UTF-8")
+
+        self.write(body)
@@ -1,25 +1,206 @@
+import asyncio
 import gzip
 import http
-import json
+import logging
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterator, List, Optional, Tuple
 
+import tornado.escape
+import tornado.ioloop
 import tornado.options
 import tornado.web
-from cachetools import LRUCache, cached
+from cachetools import LRUCache
+
+from matsuri_monitor import chat
+
+logger = logging.getLogger("tornado.general")
+
+ARCHIVE_WORKERS = 4
+INDEX_PAGE_SIZE = 100
+ARCHIVE_CACHE_BYTES = 256 * 1024 * 1024
+
+# Archives are decompressed off the IOLoop so live monitors keep polling meanwhile
+_archive_executor = ThreadPoolExecutor(
+    max_workers=ARCHIVE_WORKERS, thread_name_prefix="archive"
+)
+# Loads in progress, so concurrent requests for the same archive share one read
+_pending_loads: Dict[Tuple[Path, int], asyncio.Future] = {}
+
+
+def _read_archive(apath: Path) -> bytes:
+    # Archives are written with json.dump, so the decompressed file is already encoded JSON
+    with gzip.open(apath, "rb") as gfile:
+        return gfile.read()
+
+
+class ArchiveCache:
+    def __init__(self, max_bytes: int):
+        """LRU cache of encoded archive JSON, bounded by total size in bytes
+
+        Entries are keyed by path and modification time, so a rewritten report (e.g. by
+        combine_reports) is read again rather than served stale.
+        """
+        self._cache = LRUCache(max_bytes, getsizeof=len)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[Path, int]) -> Optional[bytes]:
+        """Return the cached JSON for the given key, or None"""
+        value = self._cache.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key: Tuple[Path, int], value: bytes):
+        """Cache the JSON for the given key, unless it alone exceeds the size bound"""
+        if len(value) <= self._cache.maxsize:
+            self._cache[key] = value
+
+    def stats(self) -> dict:
+        """Cache counters and current usage"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._cache),
+            "bytes": self._cache.currsize,
+            "max_bytes": self._cache.maxsize,
+        }
+
+
+archive_cache = ArchiveCache(ARCHIVE_CACHE_BYTES)
 
 
 class ArchivesHandler(tornado.web.RequestHandler):
     def initialize(self):
         """Simple JSON API handler that returns JSON generated by the given callable"""
         self.archives_dir: Path = tornado.options.options.archives_dir
+        self.index = chat.get_archive_index()
 
     async def get(self):
-        """GET /_monitor/archives.json"""
+        """GET /_monitor/archives.json
+
+        Reports are returned in chronological order and streamed as they are loaded, so memory use
+        does not grow with the date range, along with their file "names" in the same order. The
+        response ends with a "cursor" naming the last report sent, to pass back for the next page,
+        and whether "more" reports remain beyond "limit".
+
+        It also has a "seq" from before any report was read. Passing it back as "changed" returns
+        every report in the range that was archived or rewritten since, whatever its position
+        (without paging), so a client can refresh what it has loaded.
+        """
         since = self._start_date()
-        apaths = self._archive_paths_since(since)
-        self.write({"reports": [self._load_archive(apath) for apath in apaths]})
+        self.cursor = self.get_query_argument("cursor", None)
+        self.more = False
+        limit = self._limit()
+        changed = self._changed()
+
+        # Taken before reading the index, so reports archived meanwhile are returned next time
+        seq = self.index.last_seq()
+
+        if changed is None:
+            keys = self._archive_keys(since, limit)
+        else:
+            keys = self._changed_keys(since, changed)
+
+        self.set_header("Content-Type", "application/json; charset=UTF-8")
+        self.write(b'{"reports": [')
+
+        loads = deque()
+        names = []
+        separator = b""
+
+        # Keep a few loads in flight ahead of the report being written
+        for key in keys:
+            loads.append((key[0].name, asyncio.ensure_future(self._load_archive(key))))
+            if len(loads) < ARCHIVE_WORKERS:
+                continue
+            if await self._write_report(*loads.popleft(), separator, names):
+                separator = b", "
+
+        while len(loads) > 0:
+            if await self._write_report(*loads.popleft(), separator, names):
+                separator = b", "
+
+        self.write(b'], "names": ')
+        self.write(tornado.escape.utf8(tornado.escape.json_encode(names)))
+        self.write(b', "cursor": ')
+        self.write(tornado.escape.utf8(tornado.escape.json_encode(self.cursor)))
+        self.write(b', "more": ' + (b"true" if self.more else b"false"))
+        self.write(b', "seq": ' + str(seq).encode() + b"}")
+
+    def _archive_key(self, name: str) -> Optional[Tuple[Path, int]]:
+        """Cache key of the named archive, or None (and drop it from the index) if it is gone"""
+        apath = self.archives_dir / name
+        try:
+            return apath, apath.stat().st_mtime_ns
+        except FileNotFoundError:
+            self.index.remove(name)
+            return None
+
+    def _changed_keys(self, since: str, changed: int) -> Iterator[Tuple[Path, int]]:
+        """Yield cache keys of archives added to the index or rewritten after the given seq"""
+        for name in self.index.names_changed(since, changed):
+            key = self._archive_key(name)
+            if key is not None:
+                yield key
+
+    def _archive_keys(
+        self, since: str, limit: Optional[int]
+    ) -> Iterator[Tuple[Path, int]]:
+        """Yield cache keys of archives to send, reading the index a page at a time
+
+        Advances self.cursor past each yielded archive and sets self.more if the limit cut the
+        range short.
+        """
+        remaining = limit
+
+        while True:
+            if remaining is None:
+                page_size = INDEX_PAGE_SIZE
+            else:
+                page_size = min(INDEX_PAGE_SIZE, remaining + 1)
+
+            names = self.index.names_since(since, self.cursor, page_size)
+
+            for name in names:
+                if remaining == 0:
+                    self.more = True
+                    return
+
+                key = self._archive_key(name)
+                if key is None:
+                    continue
+
+                yield key
+                self.cursor = name
+                if remaining is not None:
+                    remaining -= 1
+
+            if len(names) < page_size:
+                return
+
+    async def _write_report(
+        self, name: str, load: asyncio.Future, separator: bytes, names: List[str]
+    ) -> bool:
+        """Write and flush one loaded report, returning False if it failed to load"""
+        try:
+            report = await load
+        except (OSError, EOFError, zlib.error) as e:
+            # Headers are already sent, so a broken archive can only be skipped
+            logger.exception(f"Failed to load archive ({type(e).__name__})")
+            return False
+
+        self.write(separator)
+        self.write(report)
+        names.append(name)
+        await self.flush()
+        return True
 
     def _start_date(self) -> str:
         try:
@@ -33,15 +214,40 @@ class ArchivesHandler(tornado.web.RequestHandler):
                 http.HTTPStatus.BAD_REQUEST, "start parameter must be ISO date"
             )
 
-    def _archive_paths_since(self, since: str) -> List[Path]:
-        condition = (
-            lambda p: p.name.endswith(".json.gz")
-            and "_chat" not in p.name
-            and p.name > since
-        )
-        return list(sorted(filter(condition, self.archives_dir.iterdir())))
-
-    @cached(LRUCache(50))
-    def _load_archive(self, apath: Path) -> dict:
-        with gzip.open(apath, "rt") as gfile:
-            return json.load(gfile)
+    def _limit(self) -> Optional[int]:
+        limit = self.get_query_argument("limit", None)
+        if limit is None:
+            return None
+        if not limit.isdigit() or int(limit) == 0:
+            raise tornado.web.HTTPError(
+                http.HTTPStatus.BAD_REQUEST, "limit parameter must be positive integer"
+            )
+        return int(limit)
+
+    def _changed(self) -> Optional[int]:
+        changed = self.get_query_argument("changed", None)
+        if changed is None:
+            return None
+        if not changed.isdigit():
+            raise tornado.web.HTTPError(
+                http.HTTPStatus.BAD_REQUEST, "changed parameter must be integer"
+            )
+        return int(changed)
+
+    async def _load_archive(self, key: Tuple[Path, int]) -> bytes:
+        report = archive_cache.get(key)
+        if report is not None:
+            return report
+
+        future = _pending_loads.get(key)
+
+        if future is None:
+            future = tornado.ioloop.IOLoop.current().run_in_executor(
+                _archive_executor, _read_archive, key[0]
+            )
+            _pending_loads[key] = future
+            future.add_done_callback(lambda _: _pending_loads.pop(key, None))
+
+        report = await future
+        archive_cache.put(key, report)
+        return report
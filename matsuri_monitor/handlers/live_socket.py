@@ -0,0 +1,65 @@
+import logging
+from collections import deque
+
+import tornado.ioloop
+import tornado.locks
+import tornado.websocket
+
+from matsuri_monitor import Supervisor
+
+logger = logging.getLogger("tornado.general")
+
+QUEUE_SIZE = 16
+
+
+class LiveSocketHandler(tornado.websocket.WebSocketHandler):
+    def initialize(self, supervisor: Supervisor):
+        """WebSocket handler that pushes deltas of the live reports as they change
+
+        Each message has the same format as a delta response from the live API, so a client can
+        connect with its last cursor and merge messages exactly like polled deltas.
+        """
+        self.supervisor = supervisor
+        self.queue = deque()
+        self.queue_ready = tornado.locks.Event()
+        self.closed = False
+
+    def open(self):
+        """GET /_monitor/live.ws"""
+        since = self.get_query_argument("since", "")
+        self.enqueue(self.supervisor.live_delta(since))
+        self.supervisor.subscribe(self.enqueue)
+        tornado.ioloop.IOLoop.current().add_callback(self.send_loop)
+
+    def enqueue(self, payload: bytes):
+        """Queue an encoded delta to be sent to this client"""
+        if self.closed:
+            return
+
+        # A client this far behind resynchronizes by reconnecting with its last cursor
+        if len(self.queue) >= QUEUE_SIZE:
+            logger.warning("Closing live socket with full send queue")
+            self.on_close()
+            self.close()
+            return
+
+        self.queue.append(payload)
+        self.queue_ready.set()
+
+    async def send_loop(self):
+        """Send queued deltas one at a time, waiting for each to be flushed"""
+        while not self.closed:
+            await self.queue_ready.wait()
+            self.queue_ready.clear()
+
+            while len(self.queue) > 0 and not self.closed:
+                try:
+                    await self.write_message(self.queue.popleft())
+                except tornado.websocket.WebSocketClosedError:
+                    return
+
+    def on_close(self):
+        self.closed = True
+        self.supervisor.unsubscribe(self.enqueue)
+        self.queue.clear()
+        self.queue_ready.set()
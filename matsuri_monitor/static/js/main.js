@@ -254,10 +254,68 @@ function LiveReport(props) {
   );
 }
 
+// Apply a delta response from the live endpoint to the current list of reports
+function mergeDelta(reports, delta) {
+  if (delta.full) return delta.reports;
+
+  const merged = new Map(reports.map((info) => [info.id, info]));
+  delta.ended.forEach((id) => merged.delete(id));
+
+  delta.reports.forEach((update) => {
+    const prev = merged.get(update.id);
+    if (update.full || prev === undefined) {
+      merged.set(update.id, update);
+      return;
+    }
+
+    // Changed group lists replace their groups from index "start" onward
+    const groupLists = new Map(
+      prev.group_lists.map((gl) => [gl.description, gl])
+    );
+    update.group_lists.forEach((gl) => {
+      const prevGl = groupLists.get(gl.description);
+      const kept =
+        prevGl === undefined ? [] : prevGl.groups.slice(0, gl.start);
+      groupLists.set(gl.description, {
+        description: gl.description,
+        notify: gl.notify,
+        index: gl.index,
+        groups: kept.concat(gl.groups),
+      });
+    });
+
+    // Lists that got their first group keep the server's (grouper) order
+    merged.set(update.id, {
+      ...prev,
+      group_lists: Array.from(groupLists.values()).sort(
+        (a, b) => a.index - b.index
+      ),
+    });
+  });
+
+  return Array.from(merged.values());
+}
+
+const SOCKET_RETRY = 10000;
+
 function ReportApp(props) {
   const [reports, setReports] = useState([]);
+  const [socketOpen, setSocketOpen] = useState(false);
+  const cursor = useRef("");
+
+  function applyDelta(data) {
+    cursor.current = data.cursor;
+    setReports((prev) => mergeDelta(prev, data));
+  }
 
   function getReports() {
+    if (props.delta) {
+      fetch(`${props.endpoint}?since=${encodeURIComponent(cursor.current)}`)
+        .then((response) => response.json())
+        .then(applyDelta);
+      return;
+    }
+
     fetch(props.endpoint)
       .then((response) => response.json())
       .then((data) => {
@@ -265,10 +323,45 @@ function ReportApp(props) {
       });
   }
 
+  // Deltas are pushed while the socket is open; polling is only a fallback
+  useEffect(() => {
+    if (!props.socket) return;
+
+    let socket = null;
+    let retry = null;
+    let stopped = false;
+
+    function connect() {
+      const protocol = window.location.protocol === "https:" ? "wss:" : "ws:";
+      const since = encodeURIComponent(cursor.current);
+      socket = new WebSocket(
+        `${protocol}//${window.location.host}${props.socket}?since=${since}`
+      );
+      socket.onopen = () => setSocketOpen(true);
+      socket.onmessage = (event) => applyDelta(JSON.parse(event.data));
+      socket.onclose = () => {
+        setSocketOpen(false);
+        if (!stopped) retry = setTimeout(connect, SOCKET_RETRY);
+      };
+    }
+
+    connect();
+
+    return () => {
+      stopped = true;
+      clearTimeout(retry);
+      socket.close();
+    };
+  }, [props.socket]);
+
   useEffect(getReports, [props.endpoint]);
-  useInterval(getReports, props.interval);
+  useInterval(getReports, socketOpen ? null : props.interval);
 
-  const reportsFiltered = reports.filter((info) => {
+  return e(ReportList, { reports: reports });
+}
+
+function ReportList(props) {
+  const reportsFiltered = props.reports.filter((info) => {
     const reportLength = info.group_lists.reduce(
       (prev, gl) => prev + gl.groups.length,
       0
@@ -298,6 +391,78 @@ function ReportApp(props) {
   );
 }
 
+const ARCHIVE_PAGE = 10;
+
+function ArchiveApp(props) {
+  const [reports, setReports] = useState([]);
+  const page = useRef({ start: null, cursor: null, seq: null, loading: false });
+
+  // Fetch reports and merge them by file name, which sorts chronologically
+  function fetchReports(current, params, then) {
+    current.loading = true;
+    const query = new URLSearchParams({ start: current.start, ...params });
+
+    fetch(`${props.endpoint}?${query}`)
+      .then((response) => response.json())
+      .then((data) => {
+        current.loading = false;
+        // Start date changed while loading
+        if (page.current !== current) return;
+
+        const firstPage = current.seq === null;
+        data.names.forEach((name, i) =>
+          current.byName.set(name, data.reports[i])
+        );
+        if (firstPage || data.names.length > 0) {
+          const names = Array.from(current.byName.keys()).sort();
+          setReports(names.map((name) => current.byName.get(name)));
+        }
+
+        then(data);
+      })
+      .catch(() => {
+        current.loading = false;
+      });
+  }
+
+  // Load pages after the cursor until caught up, rendering each as it arrives
+  function loadPages(current) {
+    const params = { limit: ARCHIVE_PAGE };
+    if (current.cursor !== null) params.cursor = current.cursor;
+
+    fetchReports(current, params, (data) => {
+      // Changes made while paging are picked up by the first poll
+      if (current.seq === null) current.seq = data.seq;
+      current.cursor = data.cursor;
+      if (data.more) loadPages(current);
+    });
+  }
+
+  // Polls fetch reports archived or rewritten since the last request, wherever
+  // they fall in the range, since an earlier stream may be archived later
+  function poll() {
+    const current = page.current;
+    if (current.seq === null || current.loading) return;
+    fetchReports(current, { changed: current.seq }, (data) => {
+      current.seq = data.seq;
+    });
+  }
+
+  useEffect(() => {
+    page.current = {
+      start: props.start,
+      cursor: null,
+      seq: null,
+      loading: false,
+      byName: new Map(),
+    };
+    loadPages(page.current);
+  }, [props.start]);
+  useInterval(poll, props.interval);
+
+  return e(ReportList, { reports: reports });
+}
+
 function ArchiveWrapper(props) {
   const [daysAgo, setDaysAgo] = useState(1);
   const date = new Date();
@@ -306,8 +471,9 @@ function ArchiveWrapper(props) {
   return e(
     React.Fragment,
     null,
-    e(ReportApp, {
-      endpoint: `${props.endpoint}?start=${dateString}`,
+    e(ArchiveApp, {
+      endpoint: props.endpoint,
+      start: dateString,
       interval: props.interval,
     }),
     e(
@@ -330,7 +496,12 @@ function ArchiveWrapper(props) {
 }
 
 ReactDOM.render(
-  e(ReportApp, { endpoint: "/_monitor/live.json", interval: 5000 }),
+  e(ReportApp, {
+    endpoint: "/_monitor/live.json",
+    interval: 5000,
+    delta: true,
+    socket: "/_monitor/live.ws",
+  }),
   document.getElementById("live-root")
 );
 ReactDOM.render(
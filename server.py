@@ -11,7 +11,7 @@ from matsuri_monitor import Supervisor, handlers
 tornado.options.define("port", default=8080, type=int, help="Run on the given port")
 tornado.options.define("debug", default=False, type=bool, help="Run in debug mode")
 tornado.options.define(
-    "interval", default=300, type=float, help="Seconds between updates"
+    "interval", default=300.0, type=float, help="Seconds between updates"
 )
 
 
@@ -24,6 +24,13 @@ def main():
 
     print(static_path)
 
+    def stats() -> dict:
+        """Runtime statistics served at /_monitor/stats.json"""
+        return {
+            "supervisor": supervisor.stats(),
+            "archive_cache": handlers.archive_cache.stats(),
+        }
+
     server = tornado.httpserver.HTTPServer(
         tornado.web.Application(
             [
@@ -31,9 +38,19 @@ def main():
                 (
                     r"/_monitor/live.json",
                     handlers.APIHandler,
-                    {"json_source": supervisor.live_json},
+                    {
+                        "json_source": supervisor.live_json,
+                        "etag_source": supervisor.live_etag,
+                        "delta_source": supervisor.live_delta,
+                    },
+                ),
+                (
+                    r"/_monitor/live.ws",
+                    handlers.LiveSocketHandler,
+                    {"supervisor": supervisor},
                 ),
                 (r"/_monitor/archive.json", handlers.ArchivesHandler),
+                (r"/_monitor/stats.json", handlers.APIHandler, {"json_source": stats}),
             ],
             debug=tornado.options.options.debug,
             static_path=static_path,
@@ -51,7 +68,13 @@ def main():
 
     supervisor.start(current_ioloop)
 
-    current_ioloop.start()
+    try:
+        current_ioloop.start()
+    except KeyboardInterrupt:
+        pass
+
+    # Close pooled connections, so aiohttp does not warn about an unclosed session at exit
+    current_ioloop.run_sync(supervisor.sessions.close)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,33 @@
+"""Archived reports for the tests"""
+
+import gzip
+import json
+from pathlib import Path
+
+
+def report_json(video_id: str) -> dict:
+    groups = [
+        [{"author": "a", "text": "まつり", "timestamp": float(i)}] for i in range(500)
+    ]
+    return {
+        "id": video_id,
+        "title": "title",
+        "channel_name": "channel",
+        "group_lists": [{"description": "d", "notify": True, "groups": groups}],
+    }
+
+
+def write_report(archives_dir: Path, name: str, report: dict) -> Path:
+    path = archives_dir / name
+    with gzip.open(path, "wt") as report_file:
+        json.dump(report, report_file)
+    return path
+
+
+def write_corrupt_report(archives_dir: Path, name: str) -> Path:
+    """A report whose deflate stream is damaged, which fails with zlib.error when read"""
+    path = write_report(archives_dir, name, report_json("corrupt"))
+    data = bytearray(path.read_bytes())
+    data[30:38] = b"\xff" * 8
+    path.write_bytes(bytes(data))
+    return path
@@ -0,0 +1,15 @@
+from pathlib import Path
+
+import pytest
+
+from tests.archives import report_json, write_corrupt_report, write_report
+
+
+@pytest.fixture
+def archives_dir(tmp_path: Path) -> Path:
+    write_report(tmp_path, "2026-10-10T120000_a.json.gz", report_json("a"))
+    write_corrupt_report(tmp_path, "2026-10-11T120000_b.json.gz")
+    write_report(tmp_path, "2026-10-12T120000_c.json.gz", {"title": "no id"})
+    write_report(tmp_path, "2026-10-13T120000_d.json.gz", report_json("d"))
+    write_report(tmp_path, "2026-10-14T120000_e.json.gz", report_json("e"))
+    return tmp_path
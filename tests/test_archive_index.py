@@ -0,0 +1,48 @@
+import sqlite3
+
+import pytest
+
+from matsuri_monitor import chat
+from matsuri_monitor.chat.archive_index import INDEX_FILENAME, SCHEMA_VERSION
+from tests.archives import report_json, write_report
+
+
+def test_rebuild_skips_broken_reports(archives_dir):
+    index = chat.ArchiveIndex(archives_dir)
+
+    assert index.names_since("2026-10-01") == [
+        "2026-10-10T120000_a.json.gz",
+        "2026-10-13T120000_d.json.gz",
+        "2026-10-14T120000_e.json.gz",
+    ]
+
+
+def test_interrupted_rebuild_is_redone(archives_dir, monkeypatch):
+    def interrupt(self, report_path, report_json):
+        raise KeyboardInterrupt()
+
+    with monkeypatch.context() as patch:
+        patch.setattr(chat.ArchiveIndex, "_insert", interrupt)
+        with pytest.raises(KeyboardInterrupt):
+            chat.ArchiveIndex(archives_dir)
+
+    conn = sqlite3.connect(str(archives_dir / INDEX_FILENAME))
+    assert conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION
+    conn.close()
+
+    index = chat.ArchiveIndex(archives_dir)
+    assert len(index.names_since("2026-10-01")) == 3
+
+
+def test_seq_never_reused(archives_dir):
+    index = chat.ArchiveIndex(archives_dir)
+    latest = "2026-10-15T120000_f.json.gz"
+    index.add(write_report(archives_dir, latest, report_json("f")), report_json("f"))
+    seq = index.last_seq()
+
+    # A client that saw the latest report still gets reports added after it was removed
+    index.remove(latest)
+    added = "2026-10-16T120000_g.json.gz"
+    index.add(write_report(archives_dir, added, report_json("g")), report_json("g"))
+
+    assert index.names_changed("2026-10-01", seq) == [added]
@@ -0,0 +1,53 @@
+import json
+import shutil
+import tempfile
+from pathlib import Path
+
+import tornado.options
+import tornado.testing
+import tornado.web
+
+from matsuri_monitor import chat, handlers
+from tests.archives import report_json, write_corrupt_report, write_report
+
+
+class ArchivesHandlerTest(tornado.testing.AsyncHTTPTestCase):
+    def get_app(self):
+        return tornado.web.Application(
+            [(r"/_monitor/archive.json", handlers.ArchivesHandler)]
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.archives_dir = tornado.options.options.archives_dir = self.get_tmp_dir()
+
+    def get_tmp_dir(self):
+        import tempfile
+        from pathlib import Path
+
+        return Path(tempfile.mkdtemp())
+
+    def test_corrupt_archive_is_skipped(self):
+        index = chat.get_archive_index()
+        for name, video_id in [
+            ("2026-10-10T120000_a", "a"),
+            ("2026-10-12T120000_c", "c"),
+        ]:
+            path = write_report(
+                self.archives_dir, f"{name}.json.gz", report_json(video_id)
+            )
+            index.add(path, report_json(video_id))
+
+        # Damaged after it was indexed, so its body fails partway through the response
+        corrupt = write_corrupt_report(self.archives_dir, "2026-10-11T120000_b.json.gz")
+        index.add(corrupt, report_json("b"))
+
+        response = self.fetch("/_monitor/archive.json?start=2026-10-01")
+
+        assert response.code == 200
+        body = json.loads(response.body)
+        assert [report["id"] for report in body["reports"]] == ["a", "c"]
+        assert body["names"] == [
+            "2026-10-10T120000_a.json.gz",
+            "2026-10-12T120000_c.json.gz",
+        ]
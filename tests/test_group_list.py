@@ -0,0 +1,90 @@
+import random
+from typing import List
+
+import pytest
+
+from matsuri_monitor import chat
+
+TRIALS = 500
+LATE_SHARE = 0.25
+MAX_LATENESS = 20
+
+
+def x_grouper(unique_author: bool, min_len: int) -> chat.Grouper:
+    return chat.Grouper(
+        type="regex",
+        value="x",
+        condition=lambda message: "x" in message.text,
+        description='Comment matches "x"',
+        interval=3,
+        min_len=min_len,
+        notify=False,
+        unique_author=unique_author,
+        skip_channels=[],
+    )
+
+
+def baseline_groups(
+    grouper: chat.Grouper, messages: List[chat.Message]
+) -> List[List[chat.Message]]:
+    """Groups computed from scratch, sorting all messages and grouping them in one pass"""
+    groups = []
+    last_timestamp = -float("inf")
+
+    for message in sorted(messages, key=lambda msg: msg.timestamp):
+        if not grouper.condition(message):
+            continue
+        if len(groups) > 0 and message.timestamp - last_timestamp <= grouper.interval:
+            if grouper.unique_author and any(
+                message.author == other.author for other in groups[-1]
+            ):
+                continue
+            groups[-1].append(message)
+        else:
+            groups.append([message])
+        last_timestamp = message.timestamp
+
+    return [group for group in groups if len(group) >= grouper.min_len]
+
+
+def replayed_chat(rand: random.Random) -> List[chat.Message]:
+    """Unique messages in arrival order, some of them arriving late"""
+    messages = {}
+    for _ in range(rand.randint(0, 60)):
+        message = chat.Message(
+            author=rand.choice("abc"),
+            text=rand.choice(["x", "y", "xx"]),
+            timestamp=float(rand.randint(0, 80)),
+            relative_timestamp=0.0,
+        )
+        messages.setdefault((message.timestamp, message.author, message.text), message)
+
+    def arrival(message: chat.Message) -> float:
+        if rand.random() < LATE_SHARE:
+            return message.timestamp + rand.uniform(0, MAX_LATENESS)
+        return message.timestamp
+
+    return sorted(messages.values(), key=arrival)
+
+
+@pytest.mark.parametrize("seed", range(TRIALS))
+def test_incremental_matches_baseline(seed):
+    """Grouping batches as they arrive matches grouping everything received from scratch"""
+    rand = random.Random(seed)
+    grouper = x_grouper(rand.random() < 0.5, rand.randint(1, 3))
+    messages = replayed_chat(rand)
+    group_list = chat.GroupList(grouper)
+
+    received = 0
+    while received < len(messages):
+        batch_size = rand.randint(1, 6)
+        batch = messages[received : received + batch_size]
+        received += batch_size
+
+        # LiveReport dispatches each batch in timestamp order
+        group_list.update(sorted(batch, key=lambda msg: msg.timestamp))
+
+        expected = baseline_groups(grouper, messages[:received])
+        assert [list(map(id, group)) for group in group_list.groups] == [
+            list(map(id, group)) for group in expected
+        ]
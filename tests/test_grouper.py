@@ -0,0 +1,68 @@
+import random
+
+import pytest
+
+from matsuri_monitor import chat
+from matsuri_monitor.chat.grouper import _regex_condition, _username_condition
+
+REGEX_VALUES = [
+    "まつり",
+    "matsuri",
+    r"\bab+c\b",
+    "(ab)+c",
+    "a.b",
+    "^ca",
+    "(?x) a b c",
+    "(?s)a.c",
+    "(?m)^b",
+    "(?a)\\w{3}",
+    "(a)?(?(1)b|c)",
+    r"(?P<x>a)(?P=x)",
+    r"(b)\1",
+]
+USERNAMES = ["viewer", "Matsuri Channel 夏色まつり"]
+ALPHABET = "abc \n.まつりMATSURI"
+TRIALS = 5_000
+
+
+def grouper(type: str, value: str) -> chat.Grouper:
+    condition = (
+        _regex_condition(value) if type == "regex" else _username_condition(value)
+    )
+    return chat.Grouper(
+        type=type,
+        value=value,
+        condition=condition,
+        description=value,
+        interval=10,
+        min_len=1,
+        notify=False,
+        unique_author=False,
+        skip_channels=[],
+    )
+
+
+@pytest.fixture(scope="module")
+def groupers():
+    return [grouper("regex", value) for value in REGEX_VALUES] + [
+        grouper("username", value) for value in USERNAMES
+    ]
+
+
+def test_match_agrees_with_conditions(groupers):
+    matcher = chat.GrouperMatcher(groupers)
+    rand = random.Random(0)
+
+    for _ in range(TRIALS):
+        text = "".join(rand.choice(ALPHABET) for _ in range(rand.randint(0, 12)))
+        message = chat.Message(rand.choice(USERNAMES + ["other"]), text, 0.0, 0.0)
+
+        expected = [i for i, g in enumerate(groupers) if g.condition(message)]
+        assert sorted(matcher.match(message)) == expected, text
+
+
+def test_plain_patterns_are_combined(groupers):
+    """Patterns that cannot be combined do not force the others out of the combined scan"""
+    matcher = chat.GrouperMatcher(groupers)
+    assert matcher._combined is not None
+    assert [groupers[i].value for i in matcher._combined_indices] == REGEX_VALUES[:6]
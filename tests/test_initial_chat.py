@@ -0,0 +1,51 @@
+import json
+
+from matsuri_monitor.clients.initial_chat import (
+    InitialChatExtractor,
+    parse_initial_chat_html,
+)
+
+CONTEXT = {"client": {"clientName": "WEB", "clientVersion": "2.0"}}
+CHAT_OBJ = {"contents": {"liveChatRenderer": {"actions": []}}}
+
+
+def page(*scripts: str) -> bytes:
+    body = "".join(f"<script>{script}</script>" for script in scripts)
+    return f"<html><body>{body}</body></html>".encode()
+
+
+def feed_in_chunks(extractor: InitialChatExtractor, data: bytes, size: int) -> bool:
+    for i in range(0, len(data), size):
+        if extractor.feed(data[i : i + size]):
+            return True
+    return extractor.feed(b"", final=True)
+
+
+def test_extracts_values_split_across_chunks():
+    data = page(
+        "ytcfg.set(%s);" % json.dumps({"INNERTUBE_API_KEY": "key"}),
+        "ytcfg.set(%s);" % json.dumps({"INNERTUBE_CONTEXT": CONTEXT}),
+        'window["ytInitialData"] = %s;' % json.dumps(CHAT_OBJ),
+    )
+    extractor = InitialChatExtractor()
+
+    assert feed_in_chunks(extractor, data, 7)
+    assert (extractor.chat_obj, extractor.key, extractor.context) == (
+        CHAT_OBJ,
+        "key",
+        CONTEXT,
+    )
+    assert parse_initial_chat_html(data.decode()) == (CHAT_OBJ, "key", CONTEXT)
+
+
+def test_null_value_is_skipped_for_the_next_marker():
+    data = page(
+        "ytcfg.set(%s);" % json.dumps({"INNERTUBE_API_KEY": "key"}),
+        "ytcfg.set(%s);" % json.dumps({"INNERTUBE_CONTEXT": None}),
+        'window["ytInitialData"] = %s;' % json.dumps(CHAT_OBJ),
+        "ytcfg.set(%s);" % json.dumps({"INNERTUBE_CONTEXT": CONTEXT}),
+    )
+    extractor = InitialChatExtractor()
+
+    assert feed_in_chunks(extractor, data, 64)
+    assert extractor.context == CONTEXT